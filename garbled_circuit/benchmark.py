@@ -0,0 +1,206 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Benchmark the phases of the protocol on the bundled circuits. Both
+# players run in one process and talk over an in-process transport, and the
+# results are printed as JSON:
+#   python -m garbled_circuit.benchmark --circuit adder64 mult64 --repeat 20
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from .basic_types import Int
+from .gc import GarblingScheme, Role, Session
+from .hashing import LABEL_SIZE
+from .parser import parse_file
+from .steps import drive
+from .transport import InprocTransport
+
+CIRCUIT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "circuit", "basic"
+)
+CIRCUITS = ["adder64", "sub64", "mult64", "zero_equal"]
+
+
+def percentiles(seconds):
+    return {
+        "mean": float(np.mean(seconds)),
+        "p50": float(np.percentile(seconds, 50)),
+        "p90": float(np.percentile(seconds, 90)),
+        "p99": float(np.percentile(seconds, 99)),
+    }
+
+
+def report(seconds, unit, count, num_byte_sent=0):
+    return {
+        "unit": unit,
+        "count": int(count),
+        "latency": percentiles(seconds),
+        "per_second": int(count) / max(float(np.percentile(seconds, 50)), 1e-9),
+        "bytes_sent": int(num_byte_sent),
+    }
+
+
+# Run f repeat times, returns the seconds of every run and the last result.
+def timeit(f, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        seconds.append(time.perf_counter() - start)
+    return seconds, result
+
+
+# Run the sender and the receiver side of a phase together repeat times.
+# The time of a run is measured by the receiver.
+def timeit_pair(sender, receiver, repeat):
+    def run_sender():
+        for _ in range(repeat):
+            sender()
+
+    thread = threading.Thread(target=run_sender)
+    thread.start()
+    seconds, result = timeit(receiver, repeat)
+    thread.join()
+    return seconds, result
+
+
+def bench_circuit(name, scheme=GarblingScheme.HALF_GATES, repeat=10):
+    filename = (
+        name if os.path.exists(name) else os.path.join(CIRCUIT_DIR, f"{name}.txt")
+    )
+    seconds, circuit = timeit(lambda: parse_file(filename), repeat)
+    results = {"parse": report(seconds, "gate", circuit.num_gate)}
+
+    transports = InprocTransport.pair()
+    sender = Session(Role.SENDER, scheme=scheme, transport=transports[0])
+    receiver = Session(Role.RECEIVER, scheme=scheme, transport=transports[1])
+    p1 = sender.register(name, circuit)
+    p2 = receiver.register(name, circuit)
+
+    def num_byte_sent():
+        return sum(transport.num_byte_sent for transport in transports)
+
+    seconds, k = timeit(p1.generate_keys, repeat)
+    num_label = np.count_nonzero(k.any(axis=2))
+    results["label_generation"] = report(seconds, "label", num_label)
+
+    seconds, garbled_table = timeit(lambda: p1.create_garbled_table(k), repeat)
+    results["garble"] = report(seconds, "gate", circuit.num_gate)
+    decoding_table = p1.create_decoding_table(k)
+
+    # The OT of the inputs of the receiver, which owns the last input.
+    num_bit = circuit.input_sizes[-1]
+    bits = np.random.randint(0, 2, num_bit)
+    pairs = k[sum(circuit.input_sizes) - num_bit : sum(circuit.input_sizes)]
+    # Set up the base OTs before the measurement.
+    timeit_pair(
+        lambda: sender.ot.transfer_many(pairs), lambda: receiver.ot.choose_many(bits), 1
+    )
+    start = num_byte_sent()
+    seconds, _ = timeit_pair(
+        lambda: sender.ot.transfer_many(pairs),
+        lambda: receiver.ot.choose_many(bits),
+        repeat,
+    )
+    results["ot"] = report(seconds, "bit", num_bit, (num_byte_sent() - start) // repeat)
+
+    def send_tables():
+        drive(p1._send(garbled_table, zmq.SNDMORE))
+        drive(p1._send(decoding_table))
+        drive(p1._recv())
+
+    start = num_byte_sent()
+    seconds, _ = timeit_pair(send_tables, lambda: drive(p2._recv_tables()), repeat)
+    num_byte = (num_byte_sent() - start) // repeat
+    results["table_transfer"] = report(seconds, "byte", num_byte, num_byte)
+
+    # Evaluate on the labels of random inputs.
+    num_input_wire = sum(circuit.input_sizes)
+    input_bits = np.random.randint(0, 2, num_input_wire)
+    input_labels = k[np.arange(num_input_wire), input_bits]
+
+    def evaluate():
+        enc_wires = np.zeros((p2.slots[1], LABEL_SIZE), dtype=np.uint8)
+        enc_wires[:num_input_wire] = input_labels
+        p2.evaluate(enc_wires, garbled_table)
+        return enc_wires
+
+    seconds, enc_wires = timeit(evaluate, repeat)
+    results["evaluate"] = report(seconds, "gate", circuit.num_gate)
+
+    seconds, outputs = timeit(lambda: p2.decode(enc_wires, decoding_table), repeat)
+    results["decode"] = report(seconds, "bit", sum(circuit.output_sizes))
+
+    # The plaintext evaluation on the same inputs.
+    inputs, offset = [], 0
+    for size in circuit.input_sizes:
+        inputs.append(Int.from_bits(list(input_bits[offset : offset + size])))
+        offset += size
+    seconds, expected = timeit(lambda: circuit(inputs), repeat)
+    results["plaintext"] = report(seconds, "gate", circuit.num_gate)
+    assert [output.val for output in outputs] == [output.val for output in expected]
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the garbled circuit protocol."
+    )
+    parser.add_argument(
+        "--circuit", nargs="+", default=CIRCUITS, help="names in circuit/basic or files"
+    )
+    parser.add_argument(
+        "--scheme",
+        default=GarblingScheme.HALF_GATES.value,
+        choices=[s.value for s in GarblingScheme],
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--output", help="write the JSON to this file instead of stdout"
+    )
+    args = parser.parse_args(argv)
+
+    scheme = GarblingScheme(args.scheme)
+    results = {
+        "scheme": scheme.value,
+        "repeat": args.repeat,
+        "circuits": {
+            name: bench_circuit(name, scheme, args.repeat) for name in args.circuit
+        },
+    }
+    s = json.dumps(results, indent=2)
+    if args.output is None:
+        print(s)
+    else:
+        with open(args.output, "w") as f:
+            f.write(s + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from .circuit import Circuit
+from .program import Program
+
+# The binary file of a compiled circuit has the layout:
+# <MAGIC> <num_gate> <num_wire> <num_input> <num_output> <wire itemsize>
+# <num_slot> <slot itemsize> <input sizes> <output sizes>
+# <op> <a> <b> <c> of the program
+# <op> <level> <a> <b> <c> of the schedule
+# <a> <b> <c> of the slots
+# where the integers of the header are int64 and every array
+# starts at a multiple of 8 bytes, so that it can be memory mapped.
+# The slots share the opcodes and the levels of the schedule, so a loaded
+# circuit needs neither levelize nor allocate.
+MAGIC = b"GCPROG\x00\x02"
+SUFFIX = ".gcp"
+
+
+def _padded(n):
+    return (n + 7) // 8 * 8
+
+
+# The sha256 of the content of a file, read block by block. The magic is
+# hashed first so that a new file format never loads an old cache.
+def content_hash(filename, block_size=1 << 20):
+    h = hashlib.sha256(MAGIC)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Open a temporary file next to filename, which replaces filename once it
+# is written, so that a concurrent load never sees a partially written file.
+@contextmanager
+def atomic_open(filename):
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def save_circuit(circuit, filename):
+    program, schedule = circuit.program, circuit.schedule
+    slots, num_slot = circuit.slots
+    header = np.array(
+        [
+            program.num_gate,
+            circuit.num_wire,
+            circuit.num_input,
+            circuit.num_output,
+            program.a.itemsize,
+            num_slot,
+            slots.a.itemsize,
+        ]
+        + list(circuit.input_sizes)
+        + list(circuit.output_sizes),
+        dtype=np.int64,
+    )
+    arrays = [program.op, program.a, program.b, program.c]
+    arrays += [schedule.op, schedule.level.astype(np.int32, copy=False)]
+    arrays += [schedule.a, schedule.b, schedule.c, slots.a, slots.b, slots.c]
+    with atomic_open(filename) as f:
+        f.write(MAGIC)
+        f.write(header.tobytes())
+        for array in arrays:
+            data = np.ascontiguousarray(array).tobytes()
+            f.write(data + bytes(_padded(len(data)) - len(data)))
+
+
+# Load a circuit saved by save_circuit. The arrays of the program, the
+# schedule and the slots are read-only views of the memory mapped file.
+def load_circuit(filename):
+    data = np.memmap(filename, dtype=np.uint8, mode="r")
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{filename} is not a compiled circuit")
+    offset = len(MAGIC)
+
+    def take(n, dtype):
+        nonlocal offset
+        num_byte = n * np.dtype(dtype).itemsize
+        if offset + num_byte > len(data):
+            raise ValueError(f"{filename} is truncated")
+        array = data[offset : offset + num_byte].view(dtype)
+        offset += _padded(num_byte)
+        return array
+
+    header = take(7, np.int64).tolist()
+    num_gate, num_wire, num_input, num_output, itemsize, num_slot, slot_itemsize = (
+        header
+    )
+    sizes = take(num_input + num_output, np.int64).tolist()
+    dtypes = {4: np.int32, 8: np.int64}
+    wire_dtype, slot_dtype = dtypes[itemsize], dtypes[slot_itemsize]
+    op = take(num_gate, np.uint8)
+    a, b, c = (take(num_gate, wire_dtype) for _ in range(3))
+    program = Program(op, a, b, c)
+    op, level = take(num_gate, np.uint8), take(num_gate, np.int32)
+    a, b, c = (take(num_gate, wire_dtype) for _ in range(3))
+    schedule = Program(op, a, b, c, level)
+    a, b, c = (take(num_gate, slot_dtype) for _ in range(3))
+    slots = Program(op, a, b, c, level)
+    circuit = Circuit.from_program(
+        program, sizes[:num_input], sizes[num_input:], num_wire
+    )
+    circuit._schedule = schedule
+    circuit._slots = slots, num_slot
+    return circuit
@@ -21,8 +21,42 @@
 
 from typing import List
 
+import numpy as np
+
 from .basic_types import Int
 from .gate import Gate
+from .program import (
+    AND,
+    EQ,
+    EQW,
+    NOT,
+    XOR,
+    allocate,
+    apply,
+    compile_gates,
+    levelize,
+    replicate,
+)
+
+
+# Pack the bit j of n values into row j of a (num_bit, ceil(n / 64))
+# uint64 array, so that bit k of row j is the bit j of values[k].
+def pack_bits(values, num_bit):
+    values = np.asarray(values, dtype=np.int64)
+    bits = (values[None, :] >> np.arange(num_bit, dtype=np.int64)[:, None]) & 1
+    num_word = (len(values) + 63) // 64
+    packed = np.zeros((num_bit, num_word * 8), dtype=np.uint8)
+    packed[:, : (len(values) + 7) // 8] = np.packbits(
+        bits.astype(np.uint8), axis=1, bitorder="little"
+    )
+    return packed.view(np.uint64)
+
+
+# The inverse of pack_bits, returns n int64 values.
+def unpack_bits(packed, n):
+    bits = np.unpackbits(packed.view(np.uint8), axis=1, bitorder="little")[:, :n]
+    weights = np.uint64(1) << np.arange(len(packed), dtype=np.uint64)
+    return (bits.T.astype(np.uint64) @ weights).view(np.int64)
 
 
 class Circuit:
@@ -32,10 +66,70 @@ class Circuit:
         self.output_sizes = output_sizes
         self.num_wire = num_wire
         self.output_offset = num_wire - sum(output_sizes)
+        self._program = None
+        self._schedule = None
+        self._slots = None
+
+    # A circuit loaded without Gate objects, e.g. by the streaming
+    # parser or from a compiled cache file.
+    @classmethod
+    def from_program(cls, program, input_sizes, output_sizes, num_wire):
+        circuit = cls(None, input_sizes, output_sizes, num_wire)
+        circuit._program = program
+        return circuit
 
+    # The gates compiled into arrays, which is what the evaluation runs on.
+    @property
+    def program(self):
+        if self._program is None:
+            self._program = compile_gates(self.gates, self.num_wire)
+        return self._program
+
+    # The program sorted into levels of independent gates.
+    @property
+    def schedule(self):
+        if self._schedule is None:
+            self._schedule = levelize(self.program, self.num_wire)
+        return self._schedule
+
+    # The schedule with its wires remapped onto reused slots and the number
+    # of the slots, so that evaluation only keeps the live wires.
+    @property
+    def slots(self):
+        if self._slots is None:
+            self._slots = allocate(
+                self.schedule, sum(self.input_sizes), self.output_offset, self.num_wire
+            )
+        return self._slots
+
+    # The circuit of n independent copies of this circuit, see replicate.
+    # The schedule and slots are replicated from the ones of this circuit.
+    def replicate(self, n):
+        num_input_wire = sum(self.input_sizes)
+        circuit = Circuit.from_program(
+            replicate(
+                self.program, n, num_input_wire, self.output_offset, self.num_wire
+            ),
+            self.input_sizes * n,
+            self.output_sizes * n,
+            n * self.num_wire,
+        )
+        circuit._schedule = replicate(
+            self.schedule, n, num_input_wire, self.output_offset, self.num_wire
+        )
+        program, num_slot = self.slots
+        num_output_wire = self.num_wire - self.output_offset
+        circuit._slots = (
+            replicate(program, n, num_input_wire, num_slot - num_output_wire, num_slot),
+            n * num_slot,
+        )
+        return circuit
+
+    # The number of the gates of the program, where a MAND gate
+    # counts as one AND gate per output.
     @property
     def num_gate(self):
-        return len(self.gates)
+        return self.program.num_gate
 
     @property
     def num_input(self):
@@ -47,23 +141,67 @@ class Circuit:
 
     def __call__(self, inputs: Int):
         assert len(inputs) == self.num_input
-        wires = [None] * self.num_wire
+        program, num_slot = self.slots
+        wires = [None] * num_slot
         wire_idx = 0
         for i in range(self.num_input):
             for j in range(self.input_sizes[i]):
                 wires[wire_idx] = inputs[i].digit(j)
                 wire_idx += 1
 
-        for gate in self.gates:
-            input_wires = [wires[i] for i in gate.input_wires]
-            output_wires = gate(input_wires)
-            assert len(output_wires) == gate.num_output
-            for i in range(gate.num_output):
-                wires[gate.output_wires[i]] = output_wires[i]
+        for op, a, b, c in program.iter():
+            x = a if op == EQ else wires[a]
+            wires[c] = bool(apply(op, x, wires[b] if b >= 0 else None))
 
         outputs = []
-        offset = self.output_offset
+        offset = num_slot - sum(self.output_sizes)
         for i in range(self.num_output):
             outputs.append(Int.from_bits(wires[offset : offset + self.output_sizes[i]]))
             offset += self.output_sizes[i]
         return outputs
+
+    # Evaluate the circuit on n inputs at once. inputs[i] holds the n values
+    # of the i-th input, and the n values of every output are returned as
+    # an int64 array. The wires are bitsliced, i.e. every wire holds
+    # the bits of all the n evaluations, so that a gate is evaluated with
+    # a single numpy operation, and every block of independent gates of the
+    # schedule is evaluated at once.
+    def evaluate_batch(self, inputs):
+        assert len(inputs) == self.num_input
+        n = len(inputs[0])
+        program, num_slot = self.slots
+        wires = np.zeros((num_slot, (n + 63) // 64), dtype=np.uint64)
+        wire_idx = 0
+        for i in range(self.num_input):
+            assert len(inputs[i]) == n
+            wires[wire_idx : wire_idx + self.input_sizes[i]] = pack_bits(
+                inputs[i], self.input_sizes[i]
+            )
+            wire_idx += self.input_sizes[i]
+
+        for op, s, e in program.iter_blocks():
+            a, b, c = program.a[s:e], program.b[s:e], program.c[s:e]
+            if op == XOR:
+                wires[c] = wires[a] ^ wires[b]
+            elif op == AND:
+                wires[c] = wires[a] & wires[b]
+            elif op == NOT:
+                wires[c] = ~wires[a]
+            elif op == EQ:
+                # All the bits of the wire are the constant.
+                wires[c] = np.where(a.astype(bool), ~np.uint64(0), np.uint64(0))[
+                    :, None
+                ]
+            elif op == EQW:
+                wires[c] = wires[a]
+            else:
+                apply(op, None, None)
+
+        outputs = []
+        offset = num_slot - sum(self.output_sizes)
+        for i in range(self.num_output):
+            outputs.append(
+                unpack_bits(wires[offset : offset + self.output_sizes[i]], n)
+            )
+            offset += self.output_sizes[i]
+        return outputs
@@ -47,10 +47,13 @@ class Gate:
         elif self.operation == Operation.NOT:
             return [not inputs[0]]
         elif self.operation == Operation.EQ:
-            raise NotImplementedError("EQ not implemented yet.")
+            # The input of EQ is the constant itself.
+            return [bool(self.input_wires[0])]
         elif self.operation == Operation.EQW:
-            raise NotImplementedError("EQW not implemented yet.")
+            return [inputs[0]]
         elif self.operation == Operation.MAND:
-            raise NotImplementedError("MAND not implemented yet.")
+            # The k ANDs of the first k inputs with the last k inputs.
+            k = self.num_output
+            return [inputs[i] and inputs[k + i] for i in range(k)]
         else:
             raise ValueError(f"Unknown operation type: {self.operation}")
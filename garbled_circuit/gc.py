@@ -19,17 +19,24 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from copy import deepcopy
+import logging
+from collections import OrderedDict, deque
 from enum import Enum
-import hashlib
-import pickle
-import random
 
+import numpy as np
 import zmq
 
 from .basic_types import Int, PlaceHolder
 from .circuit import Circuit
+from .hashing import LABEL_SIZE, LabelPRG, double, get_gate_hash
+from .instances import InstanceStore, fingerprint
+from .metrics import NULL_METRICS, timed
+from .program import AND, EQ, EQW, NOT, XOR, OPERATIONS, apply
 from .ot import OTSender, OTReceiver
+from .ot_extension import OTExtensionSender, OTExtensionReceiver
+from .parallel import ParallelGarbler
+from .steps import Player, drive, drive_async
+from .transport import ZMQChannel
 
 
 class Role(Enum):
@@ -38,194 +45,826 @@ class Role(Enum):
     RECEIVER = "RECEIVER"
 
 
-def generate_k_pair(K):
-    k0 = random.randint(0, 1 << K - 1)
-    k1 = random.randint(0, 1 << K - 1)
-    while k1 == k0:
-        k1 = random.randint(0, 1 << K - 1)
-    p0 = random.randint(0, 1)
-    p1 = 1 - p0
-    return (k0, p0), (k1, p1)
+class GarblingScheme(Enum):
+    # Every gate gets its own encrypted table.
+    YAO = "YAO"
+    # All the wires share a global offset R, so that XOR and NOT gates
+    # can be evaluated locally without any table.
+    FREE_XOR = "FREE_XOR"
+    # Free-XOR plus AND gates garbled as 2 half gates,
+    # which only need 2 ciphertexts per AND gate.
+    HALF_GATES = "HALF_GATES"
 
 
-def sha256(s):
-    return int(hashlib.sha256(s.encode("utf-8")).hexdigest(), 16)
+# The gates evaluated without table when the scheme is not YAO.
+FREE_OPCODES = [XOR, NOT]
+# The gates evaluated without table in every scheme, as the output
+# wire has the keys of the input wire.
+COPY_OPCODES = [EQW]
 
+# The tweaks of the output decoding table are separated from
+# the tweaks of the gates by the highest bit.
+OUTPUT_TWEAK = 1 << 63
 
-class GarbledCircuit(Circuit):
-    def __init__(self, circuit, role, addr, ot_addr, context=None):
-        gates = deepcopy(circuit.gates)
-        super().__init__(
-            gates, circuit.input_sizes, circuit.output_sizes, circuit.num_wire
-        )
+# The number of the batch sizes whose garbled circuits are kept,
+# the least recently used one is dropped first.
+BATCH_CACHE_SIZE = 4
+
+# The number of the chunks of a streamed table that the sender sends
+# ahead of their acks, except on a REQ/REP socket pair, where every
+# chunk waits for the ack of the one before.
+STREAM_WINDOW = 4
+
+
+# Labels are stored as uint8 arrays whose last dimension is LABEL_SIZE.
+# The lowest bit of a label is used as its permute bit.
+def permute_bits(labels):
+    return labels[..., 0] & 1
+
+
+# The keys of an instance are derived from the PRG of the session and the
+# nonce of the instance. The 2 keys of wire w are the labels of index 2w
+# and 2w + 1, and the offset R is the label of index OFFSET_INDEX.
+OFFSET_INDEX = (1 << 64) - 1
+
+
+def derive_keys_yao(prg, nonce, wires):
+    wires = np.asarray(wires, dtype=np.uint64)
+    k = prg.derive(nonce, 2 * wires[:, None] + np.arange(2, dtype=np.uint64))
+    k = k.reshape(len(wires), 2, LABEL_SIZE)
+    p0 = k[:, 0, 0] & 1
+    k[:, 1, 0] = k[:, 1, 0] & 0xFE | (1 - p0)
+    return k
+
+
+def derive_offset(prg, nonce):
+    R = prg.derive(nonce, [OFFSET_INDEX])[0]
+    # The permute bit of the offset is 1, so that the 2 labels
+    # of a wire always have different permute bits.
+    R[0] |= 1
+    return R
+
+
+# A connection between the 2 players, which keeps the sockets and
+# the state of the OT across the evaluations of many circuits. The players
+# either connect with a zmq REQ/REP socket pair for the circuits at addr
+# and one for the OT at ot_addr, or share a transport, which carries both
+# on one connection. A session with neither is offline, e.g. to garble
+# instances ahead of time.
+#
+# The protocols are generators of steps (see steps.py), e.g. evaluate_steps,
+# which are run by the blocking methods like evaluate, or by the coroutines
+# like run on the asynchronous channels of an event loop.
+class Session(Player):
+    def __init__(
+        self,
+        role,
+        addr=None,
+        ot_addr=None,
+        context=None,
+        scheme=GarblingScheme.YAO,
+        gate_hash=None,
+        ot_extension=True,
+        pool_size=8,
+        seed=None,
+        transport=None,
+        metrics=None,
+    ):
         self.role = role
-        self.context = context or zmq.Context.instance()
+        # The registry of the metrics of the session and its OT.
+        self.metrics = metrics or NULL_METRICS
+        # Both players need to agree on the garbling scheme and the gate hash.
+        self.scheme = scheme
+        self.gate_hash = self.metrics.instrument(get_gate_hash(gate_hash))
+        self.pool_size = pool_size
+        # The keys of the sender are derived from a PRG seeded once.
+        self.prg = LabelPRG(seed)
+        # Without OT extension, every input bit of the receiver costs
+        # an RSA OT, which is only worthwhile for very small inputs.
+        self.ot_extension = ot_extension
+        self.channel, self.ot = None, None
+        if transport is not None:
+            self.channel = transport.channel(0)
+            self._connect_ot(ot_addr, context, transport.channel(1), metrics)
+        elif addr is not None:
+            context = context or zmq.Context.instance()
+            if self.role == Role.SENDER:
+                socket = context.socket(zmq.REQ)
+                socket.connect(addr)
+            else:
+                socket = context.socket(zmq.REP)
+                socket.bind(addr)
+            self.channel = ZMQChannel(socket)
+            self._connect_ot(ot_addr, context, None, metrics)
+        self.circuits = {}
+
+    def _connect_ot(self, ot_addr, context, ot_channel, metrics):
         if self.role == Role.SENDER:
-            self.socket = self.context.socket(zmq.REQ)
-            self.socket.connect(addr)
-            self.ot = OTSender(ot_addr)
+            if self.ot_extension:
+                self.ot = OTExtensionSender(
+                    ot_addr,
+                    context,
+                    gate_hash=self.gate_hash,
+                    channel=ot_channel,
+                    metrics=metrics,
+                )
+            else:
+                self.ot = OTSender(
+                    ot_addr, context, channel=ot_channel, metrics=metrics
+                )
         else:
-            self.socket = self.context.socket(zmq.REP)
-            self.socket.bind(addr)
-            self.ot = OTReceiver(ot_addr)
+            if self.ot_extension:
+                self.ot = OTExtensionReceiver(
+                    ot_addr,
+                    context,
+                    gate_hash=self.gate_hash,
+                    channel=ot_channel,
+                    metrics=metrics,
+                )
+            else:
+                self.ot = OTReceiver(
+                    ot_addr, context, channel=ot_channel, metrics=metrics
+                )
+
+    # Both players need to register the same circuits with the same names.
+    def register(
+        self,
+        name,
+        circuit,
+        scheme=None,
+        chunk_size=None,
+        num_worker=None,
+        instance_dir=None,
+    ):
+        self.circuits[name] = GarbledCircuit(
+            circuit,
+            scheme=scheme,
+            session=self,
+            chunk_size=chunk_size,
+            num_worker=num_worker,
+            instance_dir=instance_dir,
+        )
+        return self.circuits[name]
+
+    def precompute(self, name, n, num_ot=None):
+        return self.circuits[name].precompute(n, num_ot)
+
+    def evaluate(self, name, inputs):
+        return drive(self.evaluate_steps(name, inputs))
+
+    async def run(self, name, inputs, executor=None):
+        return await drive_async(self.evaluate_steps(name, inputs), executor)
+
+    def evaluate_steps(self, name, inputs):
+        # The sender announces the circuit in the first frame of its
+        # first message, so that a mismatch is detected by the receiver.
+        if self.role == Role.SENDER:
+            yield from self._send(name, zmq.SNDMORE)
+        else:
+            announced = yield from self._recv()
+            if announced != name:
+                raise ValueError(f"Sender evaluates {announced}, expected {name}.")
+        return (yield from self.circuits[name].call_steps(inputs))
+
+    # Serve the evaluations announced by the sender until it closes the
+    # session, where get_inputs(name) returns the inputs of the receiver.
+    # Yields the name of the circuit and the outputs of every evaluation.
+    def serve(self, get_inputs):
+        assert self.role == Role.RECEIVER
+        while True:
+            name = drive(self._recv())
+            if name is None:
+                drive(self._send(""))
+                return
+            yield name, self.circuits[name](get_inputs(name))
+
+    def close(self):
+        drive(self.close_steps())
+
+    async def aclose(self, executor=None):
+        await drive_async(self.close_steps(), executor)
+
+    def close_steps(self):
+        # An offline session has no other player to tell.
+        if self.channel is not None and self.role == Role.SENDER:
+            yield from self._send(None)
+            yield from self._recv()
+        for circuit in self.circuits.values():
+            circuit.close()
+
+
+class GarbledCircuit(Circuit, Player):
+    def __init__(
+        self,
+        circuit,
+        role=None,
+        addr=None,
+        ot_addr=None,
+        context=None,
+        scheme=None,
+        gate_hash=None,
+        ot_extension=True,
+        pool_size=8,
+        session=None,
+        chunk_size=None,
+        num_worker=None,
+        transport=None,
+        metrics=None,
+        instance_dir=None,
+    ):
+        # The gates are never modified, so they and their compiled program
+        # are shared with the circuit.
+        super().__init__(
+            circuit.gates, circuit.input_sizes, circuit.output_sizes, circuit.num_wire
+        )
+        self._program = circuit.program
+        self._schedule = circuit.schedule
+        if session is None:
+            session = Session(
+                role,
+                addr,
+                ot_addr,
+                context,
+                scheme=scheme or GarblingScheme.YAO,
+                gate_hash=gate_hash,
+                ot_extension=ot_extension,
+                pool_size=pool_size,
+                transport=transport,
+                metrics=metrics,
+            )
+        self.session = session
+        self.role = session.role
+        self.metrics = session.metrics
+        # The scheme of the session, unless another one is given.
+        self.scheme = scheme or session.scheme
+        self.gate_hash = session.gate_hash
+        self.ot_extension = session.ot_extension
+        self.channel = session.channel
+        self.ot = session.ot
+        # The garbled table has one entry of num_row labels for every
+        # gate that is not free, indexed by the permute bits of its inputs.
+        self.num_row = 2 if self.scheme == GarblingScheme.HALF_GATES else 4
+        program = self.schedule
+        in_table = ~np.isin(program.op, [op for op in OPERATIONS if self._is_free(op)])
+        # The number of table entries before every gate.
+        self.table_start = np.concatenate([[0], np.cumsum(in_table)])
+        self.table_index = np.where(in_table, self.table_start[:-1], -1)
+        self.num_table_gate = int(self.table_start[-1])
+        # The output wires of the table gates that are not half gates.
+        yao_gate = in_table.astype(bool)
+        if self.scheme == GarblingScheme.HALF_GATES:
+            yao_gate &= program.op != AND
+        self.random_wires = program.c[yao_gate]
+        # Garble and send the table in chunks of chunk_size gates, which
+        # are evaluated by the receiver as soon as they arrive.
+        self.chunk_size = chunk_size
+        # The garbled circuits precomputed offline. The sender keeps the
+        # keys of the instances and the receiver keeps their tables.
+        self.pool_size = session.pool_size
+        self.pool = deque()
+        # The number of the input bits of the receiver in the last
+        # evaluation, the default number of the OTs to precompute.
+        self.num_receiver_bit = None
+        # The garbled circuits of the batches of the last sizes.
+        self.batches = OrderedDict()
+        # The receiver evaluates on the slots of the circuit, and so does
+        # the sender garble when streaming. They are shared by the
+        # garbled circuits of the circuit.
+        if self.role == Role.RECEIVER or chunk_size is not None:
+            self._slots = circuit.slots
+        # The sender may garble the blocks of every level in parallel
+        # on num_worker processes.
+        self.garbler = None
+        if num_worker is not None and self.role == Role.SENDER:
+            self.garbler = ParallelGarbler(self, num_worker)
+        # The instances garbled ahead of time and stored in instance_dir
+        # by the sender, which are used before garbling new instances.
+        self.instances = None
+        if instance_dir is not None and self.role == Role.SENDER:
+            self.instances = InstanceStore(instance_dir, fingerprint(self))
 
     def __call__(self, inputs):
+        return drive(self.call_steps(inputs))
+
+    # Evaluate the circuit without blocking the event loop, where the
+    # garbling, the OT and the evaluation run on executor.
+    async def run(self, inputs, executor=None):
+        return await drive_async(self.call_steps(inputs), executor)
+
+    def call_steps(self, inputs):
         assert len(inputs) == self.num_input
 
+        # When streaming, the inputs are sent before the garbled table.
+        streaming = self.chunk_size is not None and not self.pool
+        # A stored instance is sent like a new one, where k only has
+        # the keys of the input wires.
+        instance, nonce = None, None
+        if not self.pool and self.instances is not None:
+            instance = self.instances.take()
+        if self.pool:
+            # Only the online phase is left for a precomputed instance,
+            # whose input keys are derived again from its nonce.
+            if self.role == Role.SENDER:
+                k = self.derive_keys(
+                    self.pool.popleft(), np.arange(sum(self.input_sizes))
+                )
+            else:
+                garbled_table, decoding_table = self.pool.popleft()
+        elif streaming:
+            if self.role == Role.SENDER and instance is not None:
+                k = instance[2]
+            elif self.role == Role.SENDER and self.garbler is None:
+                # The keys of the slots, which are filled chunk by chunk.
+                nonce = self.session.prg.new_nonce()
+                k = self.generate_slot_keys(nonce)
+            elif self.role == Role.SENDER:
+                k = self.generate_keys()
+        else:
+            if self.role == Role.SENDER and instance is not None:
+                garbled_table, decoding_table, k = instance
+                yield from self._send_tables(garbled_table, decoding_table)
+            elif self.role == Role.SENDER:
+                k = self.generate_keys()
+                yield from self._garble_and_send(k)
+            else:
+                garbled_table, decoding_table = yield from self._recv_tables()
+
+            logging.debug("Finish send/recv garbled table and decoding table.")
+
+        # The encrypted value of wires.
+        if self.role == Role.RECEIVER:
+            enc_wires = np.zeros((self.slots[1], LABEL_SIZE), dtype=np.uint8)
+        sender_wires, receiver_wires, bits = self._split_inputs(inputs)
+        self.num_receiver_bit = len(receiver_wires)
+
+        # The sender sends the keys of its own inputs directly.
+        with self.metrics.phase("input_transfer"):
+            if self.role == Role.SENDER:
+                yield from self._send(k[sender_wires, bits])
+                yield from self._recv()
+            else:
+                enc_wires[sender_wires] = yield from self._recv()
+                yield from self._send("")
+
+        # The receiver gets the keys of all its inputs in one batch.
         if self.role == Role.SENDER:
-            # key
-            K = 32
-            k = []
-            for i in range(self.num_wire):
-                k.append(generate_k_pair(K))
+            pairs = k[receiver_wires]
+            if not self.ot_extension:
+                pairs = [(x0.tobytes(), x1.tobytes()) for x0, x1 in pairs]
+            yield from self.ot.transfer_many_steps(pairs)
+        else:
+            labels = yield from self.ot.choose_many_steps(bits)
+            if not self.ot_extension:
+                labels = [np.frombuffer(label, np.uint8) for label in labels]
+            enc_wires[receiver_wires] = labels
+
+        logging.debug("Finish send/recv encoded inputs.")
+
+        if streaming:
+            if self.role == Role.SENDER:
+                return (yield from self._garble_and_stream(k, instance, nonce))
+            return (yield from self._evaluate_stream(enc_wires))
+
+        if self.role == Role.RECEIVER:
+            self.evaluate(enc_wires, garbled_table)
+            outputs = self.decode(enc_wires, decoding_table)
+            yield from self._recv()
+            yield from self._send_outputs(outputs)
+        else:
+            yield from self._send("")
+            outputs = yield from self._recv_outputs()
 
+        return outputs
+
+    # Evaluate the circuit on n inputs at once, where inputs[i] is the list
+    # of the n values of the i-th input, or a PlaceHolder for the inputs of
+    # the other player. The n instances are garbled as one circuit of n
+    # independent copies, so their tables, input keys and OTs are sent
+    # in bulk in a single run. Like Circuit.evaluate_batch, the n values
+    # of every output are returned as an int64 array.
+    def evaluate_batch(self, inputs):
+        return drive(self.evaluate_batch_steps(inputs))
+
+    def evaluate_batch_steps(self, inputs):
+        assert len(inputs) == self.num_input
+        sizes = {
+            len(values) for values in inputs if not isinstance(values, PlaceHolder)
+        }
+        assert len(sizes) <= 1
+        n = sizes.pop() if sizes else None
+        # Both players announce n, as either of them may have no input.
+        if self.role == Role.SENDER:
+            yield from self._send(n)
+            other_n = yield from self._recv()
+        else:
+            other_n = yield from self._recv()
+            yield from self._send(n)
+        if n is None:
+            n = other_n
+        elif other_n is not None and other_n != n:
+            raise ValueError(f"Batch of {n} inputs, the other player has {other_n}.")
+        if n is None:
+            raise ValueError("Neither player has a batch of inputs.")
+
+        if n in self.batches:
+            self.batches.move_to_end(n)
+        else:
+            self.batches[n] = GarbledCircuit(
+                self.replicate(n),
+                scheme=self.scheme,
+                session=self.session,
+                chunk_size=self.chunk_size,
+            )
+            if len(self.batches) > BATCH_CACHE_SIZE:
+                self.batches.popitem(last=False)[1].close()
+        batch_inputs = []
+        for j in range(n):
+            for values in inputs:
+                if isinstance(values, PlaceHolder):
+                    batch_inputs.append(values)
+                else:
+                    batch_inputs.append(Int(values[j]))
+        outputs = yield from self.batches[n].call_steps(batch_inputs)
+        outputs = np.array([output.val for output in outputs], dtype=np.int64)
+        return list(outputs.reshape(n, self.num_output).T)
+
+    # Stop the workers of the parallel garbler.
+    def close(self):
+        if self.garbler is not None:
+            self.garbler.close()
+            self.garbler = None
+
+    # The offline phase. Garble up to n instances of the circuit ahead of
+    # time and run num_ot random OTs for each of them, where num_ot should
+    # be the number of the input bits of the receiver, by default the one
+    # of the last evaluation. Without OT extension, there are no random
+    # OTs and only the instances are precomputed. Both players need
+    # to call this with the same arguments. Returns the number of
+    # the instances added to the pool, which is bounded by pool_size.
+    def precompute(self, n, num_ot=None):
+        return drive(self.precompute_steps(n, num_ot))
+
+    def precompute_steps(self, n, num_ot=None):
+        if num_ot is None:
+            num_ot = self.num_receiver_bit
+        if self.ot_extension and num_ot is None:
+            raise ValueError("num_ot is needed before the first evaluation.")
+        n = min(n, self.pool_size - len(self.pool))
+        for _ in range(n):
+            if self.role == Role.SENDER:
+                # Only the nonce of the keys is kept.
+                nonce = self.session.prg.new_nonce()
+                yield from self._garble_and_send(self.generate_keys(nonce))
+                self.pool.append(nonce)
+            else:
+                self.pool.append((yield from self._recv_tables()))
+        if self.ot_extension:
+            yield from self.ot.precompute_steps(n * num_ot)
+        return n
+
+    # Garble n instances into the store of instance_dir, which needs no
+    # connection, e.g. in an offline session. Returns their filenames.
+    def save_instances(self, n):
+        if self.instances is None:
+            raise ValueError(
+                "The circuit has no instance_dir to save the instances to."
+            )
+        filenames = []
+        for _ in range(n):
+            k = self.generate_keys()
             garbled_table = self.create_garbled_table(k)
             decoding_table = self.create_decoding_table(k)
+            filenames.append(
+                self.instances.put(
+                    garbled_table, decoding_table, k[: sum(self.input_sizes)]
+                )
+            )
+        return filenames
 
-            self._send(garbled_table, zmq.SNDMORE)
-            self._send(decoding_table)
-            self._recv()
-        else:
-            garbled_table = self._recv()
-            decoding_table = self._recv(zmq.SNDMORE)
-            self._send("")
+    def _garble_and_send(self, k):
+        # For half gates, this will also fill the keys of
+        # the output wires of the AND gates.
+        garbled_table = self.create_garbled_table(k)
+        decoding_table = self.create_decoding_table(k)
+        yield from self._send_tables(garbled_table, decoding_table)
+        return k
 
-        print("Finish send/recv garbled table and decoding table.")
+    @timed("table_transfer")
+    def _send_tables(self, garbled_table, decoding_table):
+        yield from self._send(garbled_table, zmq.SNDMORE)
+        yield from self._send(decoding_table)
+        yield from self._recv()
 
-        # The encrypted value of wires.
-        if self.role == Role.RECEIVER:
-            enc_wires = [None] * self.num_wire
+    # Stream the table in chunks, which are garbled one by one, on the
+    # slots when nonce is given (see garble), or sliced from the table of
+    # the stored instance. The receiver acks every chunk, and the sender
+    # only waits for the ack of a chunk when the window is full.
+    def _garble_and_stream(self, k, instance=None, nonce=None):
+        window = 1 if isinstance(self.channel, ZMQChannel) else STREAM_WINDOW
+        starts = range(0, self.num_gate, self.chunk_size)
+        for n, start in enumerate(starts):
+            end = min(start + self.chunk_size, self.num_gate)
+            if instance is None:
+                garbled_table = self.garble(k, start, end, nonce)
+            else:
+                garbled_table = instance[0][
+                    self.table_start[start] : self.table_start[end]
+                ]
+            with self.metrics.phase("table_transfer"):
+                if n >= window:
+                    yield from self._recv()
+                yield from self._send(garbled_table)
+        with self.metrics.phase("table_transfer"):
+            for _ in range(min(window, len(starts))):
+                yield from self._recv()
+        decoding_table = (
+            self.create_decoding_table(k) if instance is None else instance[1]
+        )
+        with self.metrics.phase("table_transfer"):
+            yield from self._send(decoding_table)
+        return (yield from self._recv_outputs())
+
+    def _evaluate_stream(self, enc_wires):
+        for start in range(0, self.num_gate, self.chunk_size):
+            end = min(start + self.chunk_size, self.num_gate)
+            with self.metrics.phase("table_transfer"):
+                garbled_table = yield from self._recv()
+                # Ack before evaluating, so that the sender garbles
+                # the next chunk in the meantime.
+                yield from self._send("")
+            self.evaluate(enc_wires, garbled_table, start, end)
+        with self.metrics.phase("table_transfer"):
+            decoding_table = yield from self._recv()
+        outputs = self.decode(enc_wires, decoding_table)
+        yield from self._send_outputs(outputs)
+        return outputs
+
+    @timed("table_transfer")
+    def _recv_tables(self):
+        garbled_table = yield from self._recv()
+        decoding_table = yield from self._recv(zmq.SNDMORE)
+        yield from self._send("")
+        return garbled_table, decoding_table
+
+    # Split the input wires into the wires of the sender and the wires of
+    # the receiver, and get the bits of the inputs the player owns.
+    def _split_inputs(self, inputs):
+        sender_wires, receiver_wires, bits = [], [], []
         wire_idx = 0
         for i in range(self.num_input):
+            wires = list(range(wire_idx, wire_idx + self.input_sizes[i]))
+            wire_idx += self.input_sizes[i]
             if isinstance(inputs[i], PlaceHolder):
-                for j in range(self.input_sizes[i]):
-                    if self.role == Role.SENDER:
-                        self.ot.start(x0=k[wire_idx][0], x1=k[wire_idx][1])
-                    else:
-                        flag = zmq.RCVMORE if j != 0 else 0
-                        enc_wires[wire_idx] = self._recv(flag=flag)
-                    wire_idx += 1
-                if self.role == Role.RECEIVER:
-                    self._send("")
+                if self.role == Role.SENDER:
+                    receiver_wires += wires
+                else:
+                    sender_wires += wires
             else:
-                for j in range(self.input_sizes[i]):
-                    if self.role == Role.SENDER:
-                        flag = zmq.SNDMORE if j != self.input_sizes[i] - 1 else 0
-                        self._send(k[wire_idx][inputs[i].digit(j)], flag=flag)
-                    else:
-                        enc_wires[wire_idx] = self.ot.ask_for(b=inputs[i].digit(j))
-                    wire_idx += 1
                 if self.role == Role.SENDER:
-                    self._recv()
+                    sender_wires += wires
+                else:
+                    receiver_wires += wires
+                bits += [int(inputs[i].digit(j)) for j in range(self.input_sizes[i])]
+        return sender_wires, receiver_wires, bits
+
+    # Generate the keys of a new instance, or of the instance of nonce.
+    def generate_keys(self, nonce=None):
+        if nonce is None:
+            nonce = self.session.prg.new_nonce()
+        if self.scheme == GarblingScheme.YAO:
+            wires = np.arange(self.num_wire)
+        else:
+            # With Free-XOR, only the keys of the input wires and of the
+            # outputs of the gates garbled as Yao gates are generated
+            # here, and the keys of the other wires are derived during
+            # garbling. So garbling is deterministic given the keys.
+            wires = np.concatenate(
+                [np.arange(sum(self.input_sizes)), self.random_wires]
+            )
+        k = np.zeros((self.num_wire, 2, LABEL_SIZE), dtype=np.uint8)
+        k[wires] = self.derive_keys(nonce, wires)
+        return k
 
-        print("Finish send/recv encoded inputs.")
+    # The keys of the instance of nonce on the slots of the circuit, where
+    # only the keys of the input wires are derived here. The keys of the
+    # other wires are derived or garbled block by block, so only the keys
+    # of the live wires are kept.
+    def generate_slot_keys(self, nonce):
+        num_input_wire = sum(self.input_sizes)
+        k = np.zeros((self.slots[1], 2, LABEL_SIZE), dtype=np.uint8)
+        k[:num_input_wire] = self.derive_keys(nonce, np.arange(num_input_wire))
+        return k
 
-        if self.role == Role.RECEIVER:
-            for i in range(self.num_gate):
-                gate = self.gates[i]
-                if len(gate.input_wires) == 2:
-                    a, b = gate.input_wires
-                    c = gate.output_wires[0]
-                    k_a, p_a = enc_wires[a]
-                    k_b, p_b = enc_wires[b]
-                    e = garbled_table[(i, p_a, p_b)]
-                    w_c = e ^ sha256(str(k_a) + str(k_b) + str(i))
-                    k_c, p_c = w_c >> 1, w_c & 1
-                    enc_wires[c] = (k_c, p_c)
-                elif len(gate.input_wires) == 1:
-                    a = gate.input_wires[0]
-                    c = gate.output_wires[0]
-                    k_a, p_a = enc_wires[a]
-                    e = garbled_table[(i, p_a, p_b)]
-                    w_c = e ^ sha256(str(k_a) + str(i))
-                    k_c, p_c = w_c >> 1, w_c & 1
-                    enc_wires[c] = (k_c, p_c)
-                else:
-                    raise ValueError(
-                        f"Does not support gate with inputs more than 2. Got {gate.num_input}."
-                    )
-            # Decoding
-            outputs = []
-            offset = self.output_offset
-            for i in range(self.num_output):
-                output_bits = []
-                for j in range(self.output_sizes[i]):
-                    k_v, p_v = enc_wires[offset]
-                    e = decoding_table[(offset, p_v)]
-                    v = e ^ sha256(str(k_v) + "out" + str(offset))
-                    assert v == 0 or v == 1
-                    output_bits.append(bool(v))
-                    offset += 1
-                outputs.append(Int.from_bits(output_bits))
-            self._recv()
-            self._send(outputs)
+    # The keys of the given wires of the instance of nonce, which only
+    # exist for the wires whose keys are generated by generate_keys.
+    @timed("label_generation")
+    def derive_keys(self, nonce, wires):
+        prg = self.session.prg
+        if self.scheme == GarblingScheme.YAO:
+            return derive_keys_yao(prg, nonce, wires)
+        # With Free-XOR, the 1-key of every wire is its 0-key xor R.
+        R = derive_offset(prg, nonce)
+        k = np.empty((len(wires), 2, LABEL_SIZE), dtype=np.uint8)
+        k[:, 0] = prg.derive(nonce, 2 * np.asarray(wires, dtype=np.uint64))
+        k[:, 1] = k[:, 0] ^ R
+        return k
+
+    def _is_free(self, op):
+        return (
+            op in COPY_OPCODES
+            or self.scheme != GarblingScheme.YAO
+            and op in FREE_OPCODES
+        )
+
+    # The gates are garbled and evaluated by blocks of the schedule, where
+    # a block is a set of independent gates of the same opcode. The gate
+    # index i is the index of the gate in the schedule, and a, b, c and
+    # rows are the arrays of the wires and table entries of the block.
+    def _garble_free_gates(self, op, a, b, c, k, R):
+        if op == XOR:
+            k[c, 0] = k[a, 0] ^ k[b, 0]
+            k[c, 1] = k[c, 0] ^ R
+        elif op == NOT:
+            # NOT only swaps the meaning of the 2 keys.
+            k[c] = k[a, ::-1]
         else:
-            self._send("")
-            outputs = self._recv()
+            k[c] = k[a]
 
-        return outputs
+    def _evaluate_free_gates(self, op, a, b, c, enc_wires):
+        if op == XOR:
+            enc_wires[c] = enc_wires[a] ^ enc_wires[b]
+        else:
+            enc_wires[c] = enc_wires[a]
+
+    # Half gates from "Two Halves Make a Whole" (Zahur, Rosulek and Evans).
+    # The AND gate is split into a generator half gate and an evaluator
+    # half gate, each of which needs only 1 ciphertext.
+    def _garble_half_gates(self, i, a0, b0, R):
+        a1, b1 = a0 ^ R, b0 ^ R
+        p_a, p_b = a0[:, :1] & 1, b0[:, :1] & 1
+        tweaks = (2 * i[:, None] + np.array([0, 0, 1, 1])).ravel()
+        h = self.gate_hash.hash_array(
+            np.stack([a0, a1, b0, b1], axis=1).reshape(-1, LABEL_SIZE), tweaks
+        )
+        h_a0, h_a1, h_b0, h_b1 = h.reshape(-1, 4, LABEL_SIZE).transpose(1, 0, 2)
+        # Generator half gate.
+        t_g = h_a0 ^ h_a1 ^ p_b * R
+        w_g = h_a0 ^ p_a * t_g
+        # Evaluator half gate.
+        t_e = h_b0 ^ h_b1 ^ a0
+        w_e = h_b0 ^ p_b * (t_e ^ a0)
+        return w_g ^ w_e, t_g, t_e
+
+    def _evaluate_half_gates(self, i, w_a, w_b, rows):
+        tweaks = (2 * i[:, None] + np.array([0, 1])).ravel()
+        h = self.gate_hash.hash_array(
+            np.stack([w_a, w_b], axis=1).reshape(-1, LABEL_SIZE), tweaks
+        )
+        w_g, w_e = h.reshape(-1, 2, LABEL_SIZE).transpose(1, 0, 2)
+        p_a, p_b = w_a[:, :1] & 1, w_b[:, :1] & 1
+        return w_g ^ w_e ^ p_a * rows[:, 0] ^ p_b * (rows[:, 1] ^ w_a)
 
     def create_garbled_table(self, k):
-        garbled_table = {}
-        for i in range(self.num_gate):
-            gate = self.gates[i]
-            # TODO(zilinzhu) Adapt to gate of inputs larger than 2.
-            if gate.num_input > 2:
+        return self.garble(k, 0, self.num_gate)
+
+    # Garble the gates in [start, end) of the schedule,
+    # returns their part of the table. With the nonce of the instance,
+    # k holds the keys of the slots (see generate_slot_keys).
+    @timed("garble")
+    def garble(self, k, start, end, nonce=None):
+        if self.garbler is not None:
+            return self.garbler.garble(k, start, end)
+        offset = self.table_start[start]
+        garbled_table = np.zeros(
+            (self.table_start[end] - offset, self.num_row, LABEL_SIZE), dtype=np.uint8
+        )
+        R = None
+        if self.scheme != GarblingScheme.YAO:
+            # The offset of the keys could be recovered from any input wire.
+            R = k[0, 0] ^ k[0, 1]
+        for op, s, e in self.schedule.iter_blocks(start, end):
+            self._garble_block(op, s, e, k, garbled_table, offset, R, nonce)
+        return garbled_table
+
+    # Garble the gates in the block [s, e) into the table whose first
+    # entry is the entry offset of the whole table. With the nonce of
+    # the instance, the block is garbled on the slots, and the keys of
+    # its output wires that are not garbled are derived first.
+    def _garble_block(self, op, s, e, k, garbled_table, offset, R=None, nonce=None):
+        program = self.schedule if nonce is None else self.slots[0]
+        i = np.arange(s, e)
+        a, b, c = program.a[s:e], program.b[s:e], program.c[s:e]
+        j = self.table_index[s:e] - offset
+        if (
+            nonce is not None
+            and not self._is_free(op)
+            and not (self.scheme == GarblingScheme.HALF_GATES and op == AND)
+        ):
+            k[c] = self.derive_keys(nonce, self.schedule.c[s:e])
+        if self._is_free(op):
+            self._garble_free_gates(op, a, b, c, k, R)
+        elif op == EQ:
+            # The constant is public, so its key is sent as is.
+            garbled_table[j, 0] = k[c, a]
+        elif self.scheme == GarblingScheme.HALF_GATES and op == AND:
+            k[c, 0], t_g, t_e = self._garble_half_gates(i, k[a, 0], k[b, 0], R)
+            k[c, 1] = k[c, 0] ^ R
+            garbled_table[j, 0] = t_g
+            garbled_table[j, 1] = t_e
+        else:
+            # The keys of the output wire were generated with the inputs.
+            garbled_table[j] = self._garble_yao_gates(i, op, a, b, c, k)
+
+    def _garble_yao_gates(self, i, op, a, b, c, k):
+        rows = np.zeros((len(i), 4, LABEL_SIZE), dtype=np.uint8)
+        m = np.arange(len(i))
+        if b[0] >= 0:
+            # Double the first label so that swapping the
+            # 2 input labels gives a different hash.
+            w = double(k[a])[:, :, None] ^ k[b][:, None, :]
+            h = self.gate_hash.hash_array(w.reshape(-1, LABEL_SIZE), np.repeat(i, 4))
+            h = h.reshape(-1, 2, 2, LABEL_SIZE)
+            for v_a in [0, 1]:
+                for v_b in [0, 1]:
+                    v_c = apply(op, v_a, v_b)
+                    p = (k[a, v_a, 0] & 1) << 1 | k[b, v_b, 0] & 1
+                    rows[m, p] = h[:, v_a, v_b] ^ k[c, v_c]
+        else:
+            h = self.gate_hash.hash_array(k[a].reshape(-1, LABEL_SIZE), np.repeat(i, 2))
+            h = h.reshape(-1, 2, LABEL_SIZE)
+            for v_a in [0, 1]:
+                v_c = apply(op, v_a, None)
+                rows[m, k[a, v_a, 0] & 1] = h[:, v_a] ^ k[c, v_c]
+        return rows[:, : self.num_row]
+
+    # Evaluate the gates in [start, end) of the schedule, where
+    # garbled_table is the part of the table of these gates.
+    @timed("evaluate")
+    def evaluate(self, enc_wires, garbled_table, start=0, end=None):
+        if end is None:
+            end = self.num_gate
+        offset = self.table_start[start]
+        program, _ = self.slots
+        for op, s, e in program.iter_blocks(start, end):
+            i = np.arange(s, e)
+            a, b, c = program.a[s:e], program.b[s:e], program.c[s:e]
+            if self._is_free(op):
+                self._evaluate_free_gates(op, a, b, c, enc_wires)
+                continue
+            rows = garbled_table[self.table_index[s:e] - offset]
+            if op == EQ:
+                enc_wires[c] = rows[:, 0]
                 continue
-            if gate.num_input == 2:
-                a, b = gate.input_wires
-                c = gate.output_wires[0]
-                for v_a in [0, 1]:
-                    k_v_a, p_v_a = k[a][v_a]
-                    for v_b in [0, 1]:
-                        k_v_b, p_v_b = k[b][v_b]
-
-                        v_c = gate([bool(v_a), bool(v_b)])[0]
-                        k_v_c, p_v_c = k[c][v_c]
-                        w_c = k_v_c << 1 | p_v_c
-                        # TODO(zilinzhu) The concatenate here seems wrong...
-                        # Need to double check the algorithm.
-                        h = sha256(str(k_v_a) + str(k_v_b) + str(i))
-                        e = h ^ w_c
-                        assert e ^ h == w_c
-                        garbled_table[(i, p_v_a, p_v_b)] = e
-            elif gate.num_input == 1:
-                a = gate.input_wires[0]
-                c = gate.output_wires[0]
-                for v_a in [0, 1]:
-                    k_v_a, p_v_a = k[a][v_a]
-
-                    v_c = gate([bool(v_a)])[0]
-                    k_v_c, p_v_c = k[c][v_c]
-                    w_c = k_v_c << 1 | p_v_c
-                    # TODO(zilinzhu) The concatenate here seems wrong...
-                    # Need to double check the algorithm.
-                    h = sha256(str(k_v_a) + str(i))
-
-                    e = h ^ w_c
-                    garbled_table[(i, p_v_a)] = e
+            w_a = enc_wires[a]
+            if self.scheme == GarblingScheme.HALF_GATES and op == AND:
+                enc_wires[c] = self._evaluate_half_gates(i, w_a, enc_wires[b], rows)
+            elif b[0] >= 0:
+                w_b = enc_wires[b]
+                h = self.gate_hash.hash_array(double(w_a) ^ w_b, i)
+                p = (w_a[:, 0] & 1) << 1 | w_b[:, 0] & 1
+                enc_wires[c] = rows[np.arange(e - s), p] ^ h
             else:
-                raise ValueError(
-                    f"Does not support gate with inputs more than 2. Got {gate.num_input}."
-                )
-        return garbled_table
+                h = self.gate_hash.hash_array(w_a, i)
+                enc_wires[c] = rows[np.arange(e - s), w_a[:, 0] & 1] ^ h
 
+    @timed("garble")
     def create_decoding_table(self, k):
-        decoding_table = {}
-        offset = self.output_offset
-        for i in range(self.num_output):
-            for _ in range(self.output_sizes[i]):
-                for v in [0, 1]:
-                    k_v, p_v = k[offset][v]
-                    # Here the last bit should be the index of
-                    # the gate which is responsible to the output.
-                    e = sha256(str(k_v) + "out" + str(offset)) ^ v
-                    decoding_table[(offset, p_v)] = e
-                offset += 1
+        # Here the tweak should be the index of
+        # the wire which is responsible to the output.
+        n = self.num_wire - self.output_offset
+        offsets = np.arange(self.output_offset, self.num_wire, dtype=np.uint64)
+        tweaks = np.repeat(offsets | np.uint64(OUTPUT_TWEAK), 2)
+        # The output wires are the last wires or slots.
+        w = k[len(k) - n :]
+        h = self.gate_hash.hash_array(w.reshape(2 * n, LABEL_SIZE), tweaks)
+        h = h.reshape(n, 2, LABEL_SIZE)
+        h[:, 1, 0] ^= 1
+        decoding_table = np.empty_like(h)
+        p = permute_bits(w)
+        decoding_table[np.arange(n)[:, None], p] = h
         return decoding_table
 
-    def _send(self, data, flag=0):
-        self.socket.send(pickle.dumps(data), flag)
+    @timed("decode")
+    def decode(self, enc_wires, decoding_table):
+        n = self.num_wire - self.output_offset
+        offsets = np.arange(self.output_offset, self.num_wire, dtype=np.uint64)
+        # The output wires are the last wires or slots.
+        w = enc_wires[len(enc_wires) - n :]
+        h = self.gate_hash.hash_array(w, offsets | np.uint64(OUTPUT_TWEAK))
+        v = decoding_table[np.arange(n), permute_bits(w)] ^ h
+        assert not v[:, 1:].any() and (v[:, 0] <= 1).all()
+        outputs = []
+        offset = 0
+        for i in range(self.num_output):
+            bits = v[offset : offset + self.output_sizes[i], 0].astype(bool)
+            outputs.append(Int.from_bits(list(bits)))
+            offset += self.output_sizes[i]
+        return outputs
+
+    def _send_outputs(self, outputs):
+        yield from self._send(
+            np.array([output.val for output in outputs], dtype=np.int64)
+        )
 
-    def _recv(self, flag=0):
-        return pickle.loads(self.socket.recv(flag))
+    def _recv_outputs(self):
+        return [Int(val) for val in (yield from self._recv())]
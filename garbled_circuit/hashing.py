@@ -0,0 +1,188 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import os
+
+import numpy as np
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:  # pragma: no cover
+    Cipher = None
+
+# Number of bytes of a wire label.
+LABEL_SIZE = 16
+
+# A fixed and public key for the fixed-key AES hash.
+FIXED_KEY = bytes(range(LABEL_SIZE))
+
+
+def xor_bytes(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(
+        len(a), "little"
+    )
+
+
+def double(labels):
+    # Multiply the labels by x in GF(2^128).
+    x = np.ascontiguousarray(labels).view("<u8")
+    lo, hi = x[..., 0], x[..., 1]
+    y = np.empty_like(x)
+    y[..., 0] = (lo << np.uint64(1)) ^ ((hi >> np.uint64(63)) * np.uint64(0x87))
+    y[..., 1] = (hi << np.uint64(1)) | (lo >> np.uint64(63))
+    return y.view(np.uint8)
+
+
+class GateHash:
+    name = None
+
+    # Hash a label of LABEL_SIZE bytes with an integer tweak,
+    # which is usually the index of the gate.
+    def __call__(self, label, tweak):
+        raise NotImplementedError
+
+    # Hash n labels stored in an (n, LABEL_SIZE) uint8 array,
+    # with n tweaks. Returns an (n, LABEL_SIZE) uint8 array.
+    def hash_array(self, labels, tweaks):
+        out = np.empty_like(labels)
+        for i in range(len(labels)):
+            out[i] = np.frombuffer(self(labels[i].tobytes(), int(tweaks[i])), np.uint8)
+        return out
+
+
+class Blake2GateHash(GateHash):
+    name = "blake2"
+
+    def __call__(self, label, tweak):
+        return hashlib.blake2b(
+            label + tweak.to_bytes(8, "little"), digest_size=LABEL_SIZE
+        ).digest()
+
+
+class SHA256GateHash(GateHash):
+    name = "sha256"
+
+    def __call__(self, label, tweak):
+        return hashlib.sha256(label + tweak.to_bytes(8, "little")).digest()[:LABEL_SIZE]
+
+
+# The tweakable correlation robust hash from "Efficient and Secure
+# Multiparty Computation from Fixed-Key Block Ciphers" (Guo et al.):
+#   H(x, i) = pi(pi(x) ^ i) ^ pi(x)
+# where pi is AES with a fixed key.
+class AESGateHash(GateHash):
+    name = "aes"
+
+    def __init__(self, key=FIXED_KEY):
+        if Cipher is None:
+            raise ImportError("AESGateHash requires the cryptography package.")
+        self.key = key
+        self.encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+
+    # The encryptor can not be pickled, so it is created again from the key,
+    # e.g. by the workers of the parallel garbler.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["encryptor"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.encryptor = Cipher(algorithms.AES(self.key), modes.ECB()).encryptor()
+
+    def __call__(self, label, tweak):
+        y = self.encryptor.update(label)
+        z = self.encryptor.update(xor_bytes(y, tweak.to_bytes(LABEL_SIZE, "little")))
+        return xor_bytes(y, z)
+
+    def hash_array(self, labels, tweaks):
+        # Encrypt all the blocks with a single call.
+        n = len(labels)
+        y = np.frombuffer(
+            self.encryptor.update(np.ascontiguousarray(labels).tobytes()), np.uint8
+        ).reshape(n, LABEL_SIZE)
+        t = np.zeros((n, 2), dtype="<u8")
+        t[:, 0] = tweaks
+        z = np.frombuffer(
+            self.encryptor.update((y ^ t.view(np.uint8)).tobytes()), np.uint8
+        ).reshape(n, LABEL_SIZE)
+        return y ^ z
+
+
+# A cryptographic PRG of labels seeded once. The label of (nonce, index)
+# is the encryption of the block (index, nonce) with AES keyed by the seed,
+# or the blake2b of the block keyed by the seed without AES. So labels can
+# be generated in bulk, or derived again on demand from their index.
+class LabelPRG:
+    def __init__(self, seed=None):
+        self.seed = seed if seed is not None else os.urandom(LABEL_SIZE)
+        assert len(self.seed) == LABEL_SIZE
+        self.encryptor = None
+        if Cipher is not None:
+            self.encryptor = Cipher(algorithms.AES(self.seed), modes.ECB()).encryptor()
+        self.num_nonce = 0
+
+    # A nonce that is never returned again by this PRG.
+    def new_nonce(self):
+        self.num_nonce += 1
+        return self.num_nonce - 1
+
+    # The labels of (nonce, index) for every index in indices.
+    def derive(self, nonce, indices):
+        indices = np.asarray(indices, dtype=np.uint64).ravel()
+        blocks = np.empty((len(indices), 2), dtype="<u8")
+        blocks[:, 0] = indices
+        blocks[:, 1] = nonce
+        if self.encryptor is not None:
+            data = self.encryptor.update(blocks.tobytes())
+        else:
+            data = b"".join(
+                hashlib.blake2b(
+                    block.tobytes(), digest_size=LABEL_SIZE, key=self.seed
+                ).digest()
+                for block in blocks
+            )
+        return np.frombuffer(bytearray(data), np.uint8).reshape(
+            len(indices), LABEL_SIZE
+        )
+
+    # n fresh labels.
+    def labels(self, n):
+        return self.derive(self.new_nonce(), np.arange(n))
+
+
+GATE_HASHES = {
+    Blake2GateHash.name: Blake2GateHash,
+    SHA256GateHash.name: SHA256GateHash,
+    AESGateHash.name: AESGateHash,
+}
+
+
+def get_gate_hash(gate_hash=None):
+    if isinstance(gate_hash, GateHash):
+        return gate_hash
+    if gate_hash is None:
+        # Prefer the fixed-key AES when it is available.
+        gate_hash = AESGateHash.name if Cipher is not None else Blake2GateHash.name
+    if gate_hash not in GATE_HASHES:
+        raise ValueError(f"Unknown gate hash: {gate_hash}")
+    return GATE_HASHES[gate_hash]()
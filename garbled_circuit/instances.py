@@ -0,0 +1,143 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The garbled instances precomputed by the sender and stored on disk. An
+# instance is only used once, so every instance is a file of its own:
+# <MAGIC> <fingerprint> <num_table_gate> <num_row> <num_output_wire>
+# <num_input_wire> <garbled table> <decoding table> <input keys>
+# where the fingerprint is the sha256 of the circuit, the garbling scheme
+# and the gate hash, the integers are int64, and the arrays are labels
+# that can be memory mapped. The input keys are the 2 keys of every input
+# wire, so the files must be kept as secret as the keys of the sender.
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from .cache import atomic_open
+from .hashing import LABEL_SIZE
+
+MAGIC = b"GCINST\x00\x01"
+SUFFIX = ".gci"
+FINGERPRINT_SIZE = 32
+
+
+# The fingerprint of the garbled instances of a garbled circuit.
+def fingerprint(gc):
+    program = gc.schedule
+    h = hashlib.sha256(MAGIC)
+    header = f"{gc.scheme.value} {gc.gate_hash.name} {gc.input_sizes} {gc.output_sizes}"
+    h.update(header.encode("utf-8"))
+    for array in (program.op, program.a, program.b, program.c):
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.digest()
+
+
+def save_instance(filename, fingerprint, garbled_table, decoding_table, input_keys):
+    header = np.array(
+        [
+            len(garbled_table),
+            garbled_table.shape[1],
+            len(decoding_table),
+            len(input_keys),
+        ],
+        dtype=np.int64,
+    )
+    with atomic_open(filename) as f:
+        f.write(MAGIC)
+        f.write(fingerprint)
+        f.write(header.tobytes())
+        for array in (garbled_table, decoding_table, input_keys):
+            f.write(np.ascontiguousarray(array, dtype=np.uint8).tobytes())
+
+
+# Load an instance saved by save_instance, returns its fingerprint, and
+# the garbled table, the decoding table and the input keys as read-only
+# views of the memory mapped file.
+def load_instance(filename):
+    data = np.memmap(filename, dtype=np.uint8, mode="r")
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{filename} is not a garbled instance")
+    offset = len(MAGIC) + FINGERPRINT_SIZE + 32
+    if offset > len(data):
+        raise ValueError(f"{filename} is truncated")
+    fingerprint = bytes(data[len(MAGIC) : len(MAGIC) + FINGERPRINT_SIZE])
+    num_table_gate, num_row, num_output_wire, num_input_wire = (
+        data[offset - 32 : offset].view(np.int64).tolist()
+    )
+    arrays = []
+    for shape in [(num_table_gate, num_row), (num_output_wire, 2), (num_input_wire, 2)]:
+        num_byte = int(np.prod(shape)) * LABEL_SIZE
+        if offset + num_byte > len(data):
+            raise ValueError(f"{filename} is truncated")
+        arrays.append(data[offset : offset + num_byte].reshape(shape + (LABEL_SIZE,)))
+        offset += num_byte
+    return (fingerprint,) + tuple(arrays)
+
+
+# A directory of the instances of one garbled circuit, which could be
+# filled by another process, e.g. ahead of time, and survives restarts.
+# The instances are taken in the order they were put.
+class InstanceStore:
+    def __init__(self, directory, fingerprint):
+        self.fingerprint = fingerprint
+        self.directory = os.path.join(directory, fingerprint.hex())
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._filenames())
+
+    def put(self, garbled_table, decoding_table, input_keys):
+        filename = os.path.join(
+            self.directory, f"{time.time_ns():020d}-{os.urandom(4).hex()}{SUFFIX}"
+        )
+        save_instance(
+            filename, self.fingerprint, garbled_table, decoding_table, input_keys
+        )
+        return filename
+
+    # Take the oldest instance out of the store, returns its garbled table,
+    # decoding table and input keys, or None if the store is empty. The
+    # file is removed once it is mapped, so that an instance is never used
+    # twice, even by the processes sharing the directory.
+    def take(self):
+        for filename in self._filenames():
+            path = os.path.join(self.directory, filename)
+            claimed = path + ".claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Taken by another process.
+                continue
+            try:
+                fingerprint, *arrays = load_instance(claimed)
+            finally:
+                os.unlink(claimed)
+            if fingerprint != self.fingerprint:
+                raise ValueError(f"{filename} is an instance of another circuit")
+            return tuple(arrays)
+        return None
+
+    def _filenames(self):
+        return sorted(
+            name for name in os.listdir(self.directory) if name.endswith(SUFFIX)
+        )
@@ -0,0 +1,172 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The instrumentation of the players. The garbled circuits, the sessions
+# and the OTs record the time of their phases and count their messages,
+# bytes and hashes into a Metrics registry, which could be shared by many
+# sessions. Without a registry they record into NULL_METRICS, which does
+# nothing, so instrumentation costs a method call when disabled.
+#
+# Phases: label_generation, garble, table_transfer, input_transfer,
+# ot, ot_setup, ot_precompute, evaluate and decode. The phases of
+# transfers include the time waiting for the other player.
+# Counters: messages_sent, bytes_sent, messages_received, bytes_received,
+# hash_calls and hash_labels.
+import functools
+import inspect
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+from . import protocol
+from .hashing import GateHash
+
+
+class Metrics:
+    # callback(kind, name, value) is called on every record, where kind is
+    # "phase" with the seconds of the phase, or "counter" with the
+    # increment, e.g. to export the records to another metrics system.
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # The number of runs and the total seconds of every phase.
+            self.phases = defaultdict(lambda: [0, 0.0])
+            self.counters = defaultdict(int)
+
+    def phase(self, name):
+        return _Timer(self, name)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+        if self.callback is not None:
+            self.callback("counter", name, n)
+
+    def record_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name][0] += 1
+            self.phases[name][1] += seconds
+        if self.callback is not None:
+            self.callback("phase", name, seconds)
+
+    # Count a value sent or received, where direction is "sent" or
+    # "received". The bytes are the bytes of its frames.
+    def message(self, direction, data):
+        self.count(f"messages_{direction}")
+        self.count(
+            f"bytes_{direction}",
+            sum(memoryview(frame).nbytes for frame in protocol.encode(data)),
+        )
+
+    # The gate hash that counts its calls into this registry.
+    def instrument(self, gate_hash):
+        if isinstance(gate_hash, CountingGateHash) and gate_hash.metrics is self:
+            return gate_hash
+        return CountingGateHash(gate_hash, self)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "phases": {
+                    name: {"count": n, "seconds": seconds}
+                    for name, (n, seconds) in self.phases.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record_phase(self.name, time.perf_counter() - self.start)
+
+
+class NullMetrics:
+    _timer = nullcontext()
+
+    def phase(self, name):
+        return self._timer
+
+    def count(self, name, n=1):
+        pass
+
+    def message(self, direction, data):
+        pass
+
+    def instrument(self, gate_hash):
+        return gate_hash
+
+
+NULL_METRICS = NullMetrics()
+
+
+# Time every call of a method as the phase name in self.metrics. The
+# phase of a protocol of steps lasts until the protocol finishes.
+def timed(name):
+    def decorator(f):
+        if inspect.isgeneratorfunction(f):
+
+            @functools.wraps(f)
+            def steps(self, *args, **kwargs):
+                with self.metrics.phase(name):
+                    return (yield from f(self, *args, **kwargs))
+
+            return steps
+
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.phase(name):
+                return f(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# A gate hash that counts the hash calls and the labels hashed. The
+# hashes computed by the workers of a ParallelGarbler are not counted.
+class CountingGateHash(GateHash):
+    def __init__(self, gate_hash, metrics):
+        self.gate_hash = gate_hash
+        self.metrics = metrics
+        self.name = gate_hash.name
+
+    def __call__(self, label, tweak):
+        self.metrics.count("hash_calls")
+        self.metrics.count("hash_labels")
+        return self.gate_hash(label, tweak)
+
+    def hash_array(self, labels, tweaks):
+        self.metrics.count("hash_calls")
+        self.metrics.count("hash_labels", len(labels))
+        return self.gate_hash.hash_array(labels, tweaks)
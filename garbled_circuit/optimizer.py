@@ -0,0 +1,178 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+from .circuit import Circuit
+from .program import AND, EQ, EQW, NOT, XOR, Program, wire_dtype
+
+# The root of the wires of a constant value.
+CONST = -1
+
+
+# Optimize the gates of a circuit, returns the optimized circuit and a
+# report of the number of gates removed by every pass. The passes are:
+#  - fold: NOT, EQ and EQW gates are replaced by tracking every wire as
+#    (root, inverted), inversions are pushed through XOR gates, and
+#    gates with a constant input are folded. A NOT gate is only emitted
+#    where an AND gate or an output needs the inverted value.
+#  - duplicate: gates of the same operation on the same inputs are merged.
+#  - dead: gates that do not reach any output wire are removed.
+# The input and output wires are kept, the wires of the new NOT gates
+# are inserted before the output wires.
+def optimize(circuit: Circuit):
+    program = circuit.program
+    num_wire = circuit.num_wire
+    output_offset = circuit.output_offset
+
+    # Wire w has the value of wire root[w] xor inv[w], or the value inv[w]
+    # if root[w] is CONST.
+    root = list(range(num_wire))
+    inv = [0] * num_wire
+    written = [False] * num_wire
+    for w in range(sum(circuit.input_sizes)):
+        written[w] = True
+    # The wire holding every (root, inv) that has been emitted.
+    held = {}
+    # The output wire of every (op, input, input) that has been emitted.
+    emitted = {}
+    new_wires = []
+    num_duplicate = 0
+    ops, a_s, b_s, c_s = [], [], [], []
+
+    def emit(op, a, b, c):
+        ops.append(op)
+        a_s.append(a)
+        b_s.append(b)
+        c_s.append(c)
+        written[c] = True
+
+    # Returns a wire holding the value of wire w, emits the gate
+    # computing it if there is none.
+    def exact(w):
+        r, f = root[w], inv[w]
+        if r != CONST and f == 0:
+            return r
+        if (r, f) in held:
+            return held[(r, f)]
+        if written[w]:
+            holder = num_wire + len(new_wires)
+            new_wires.append(holder)
+            written.append(False)
+        else:
+            holder = w
+        if r == CONST:
+            emit(EQ, f, -1, holder)
+        else:
+            emit(NOT, r, -1, holder)
+        held[(r, f)] = holder
+        return holder
+
+    for op, a, b, c in program.iter():
+        if c >= output_offset:
+            # The output wires have to hold their exact value.
+            if op == EQ:
+                emit(op, a, b, c)
+            else:
+                emit(op, exact(a), exact(b) if b >= 0 else -1, c)
+            continue
+        if op == EQ:
+            root[c], inv[c] = CONST, a
+        elif op == EQW:
+            root[c], inv[c] = root[a], inv[a]
+        elif op == NOT:
+            root[c], inv[c] = root[a], inv[a] ^ 1
+        elif root[a] == CONST or root[b] == CONST:
+            x, y = (a, b) if root[b] == CONST else (b, a)
+            if op == XOR:
+                root[c], inv[c] = root[x], inv[x] ^ inv[y]
+            elif inv[y] == 1:
+                root[c], inv[c] = root[x], inv[x]
+            else:
+                root[c], inv[c] = CONST, 0
+        elif op == XOR:
+            key = (XOR, min(root[a], root[b]), max(root[a], root[b]))
+            if key not in emitted:
+                emit(XOR, root[a], root[b], c)
+                emitted[key] = c
+            else:
+                num_duplicate += 1
+            root[c], inv[c] = emitted[key], inv[a] ^ inv[b]
+        elif op == AND:
+            x, y = sorted([(root[a], inv[a]), (root[b], inv[b])])
+            key = (AND, x, y)
+            if x == y:
+                num_duplicate += 1
+                root[c], inv[c] = x
+            elif key not in emitted:
+                emit(AND, exact(a), exact(b), c)
+                emitted[key] = c
+                root[c], inv[c] = c, 0
+            else:
+                num_duplicate += 1
+                root[c], inv[c] = emitted[key], 0
+        else:
+            raise ValueError(f"Unknown opcode {op}")
+
+    # Remove the gates whose output is not used, from the last gate.
+    num_new = len(new_wires)
+    live = np.zeros(num_wire + num_new, dtype=bool)
+    live[output_offset:num_wire] = True
+    keep = np.zeros(len(ops), dtype=bool)
+    for i in range(len(ops) - 1, -1, -1):
+        if live[c_s[i]]:
+            keep[i] = True
+            if ops[i] != EQ:
+                live[a_s[i]] = True
+            if b_s[i] >= 0:
+                live[b_s[i]] = True
+
+    # Insert the new wires before the output wires.
+    dtype = wire_dtype(num_wire + num_new)
+    renumber = np.concatenate(
+        [
+            np.arange(output_offset),
+            np.arange(output_offset, num_wire) + num_new,
+            np.arange(output_offset, output_offset + num_new),
+            [-1],
+        ]
+    ).astype(dtype)
+    op = np.array(ops, dtype=np.uint8)[keep]
+    a = np.array(a_s, dtype=dtype)[keep]
+    b = renumber[np.array(b_s, dtype=dtype)[keep]]
+    c = renumber[np.array(c_s, dtype=dtype)[keep]]
+    a = np.where(op == EQ, a, renumber[a])
+    optimized = Circuit.from_program(
+        Program(op, a, b, c),
+        circuit.input_sizes,
+        circuit.output_sizes,
+        num_wire + num_new,
+    )
+
+    num_gate = program.num_gate
+    report = {
+        "fold": num_gate - num_duplicate - len(ops),
+        "duplicate": num_duplicate,
+        "dead": len(ops) - optimized.num_gate,
+        "num_gate": (num_gate, optimized.num_gate),
+        "num_and": (len(program.groups[AND]), len(optimized.program.groups[AND])),
+    }
+    return optimized, report
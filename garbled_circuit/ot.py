@@ -19,18 +19,60 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """public key based olivious transfer"""
-# TODO(zilinzhu) Find a way to use less pickle...
-import pickle
 
 import zmq
 import rsa
 
+from .metrics import NULL_METRICS, timed
+from .steps import Player, drive
+from .transport import ZMQChannel
 
-class OTSender:
-    def __init__(self, addr, context=None):
-        self.context = context or zmq.Context.instance()
-        self.socket = self.context.socket(zmq.REP)
-        self.socket.bind(addr)
+BYTES_VALUE = b"\x00"
+INT_VALUE = b"\x01"
+
+
+# The values are encoded by a kind byte and the content,
+# so that decrypted values are never unpickled.
+def encode_value(x):
+    if isinstance(x, bytes):
+        return BYTES_VALUE + x
+    n = (x.bit_length() + 8) // 8
+    return INT_VALUE + x.to_bytes(n, "little", signed=True)
+
+
+def decode_value(s):
+    if s[:1] == BYTES_VALUE:
+        return s[1:]
+    if s[:1] == INT_VALUE:
+        return int.from_bytes(s[1:], "little", signed=True)
+    raise ValueError("Invalid OT value.")
+
+
+# The OT runs on channel if it is given, e.g. a channel of the transport
+# of a session, or else on a zmq socket of its own, where the sender binds
+# a REP socket at addr and the receiver connects a REQ socket to it. The
+# metrics of the OT are recorded into metrics.
+class OTPlayer(Player):
+    socket_type = None
+
+    def __init__(self, addr, context=None, channel=None, metrics=None):
+        if channel is None:
+            context = context or zmq.Context.instance()
+            socket = context.socket(self.socket_type)
+            if self.socket_type == zmq.REP:
+                socket.bind(addr)
+            else:
+                socket.connect(addr)
+            channel = ZMQChannel(socket)
+        self.channel = channel
+        self.metrics = metrics or NULL_METRICS
+
+
+class OTSender(OTPlayer):
+    socket_type = zmq.REP
+
+    def __init__(self, addr, context=None, channel=None, metrics=None):
+        super().__init__(addr, context, channel, metrics)
         self.x0, self.x1 = None, None
         self.started = False
 
@@ -40,50 +82,58 @@ class OTSender:
             self.listen()
 
     def listen(self):
-        pub_0 = self._recv()
-        pub_1 = self._recv(zmq.RCVMORE)
-
-        enc_x0 = rsa.encrypt(pickle.dumps(self.x0), pub_0)
-        enc_x1 = rsa.encrypt(pickle.dumps(self.x1), pub_1)
-        self._send(enc_x0, zmq.SNDMORE)
-        self._send(enc_x1)
+        self.transfer_many([(self.x0, self.x1)])
         self.started = False
 
-    def _send(self, data, flag=0):
-        self.socket.send(pickle.dumps(data), flag)
+    # Send pairs[j][b_j] for every pair with only one round trip,
+    # where b is the choices of the receiver.
+    def transfer_many(self, pairs):
+        drive(self.transfer_many_steps(pairs))
 
-    def _recv(self, flag=0):
-        return pickle.loads(self.socket.recv(flag))
+    @timed("ot")
+    def transfer_many_steps(self, pairs):
+        pubs = yield from self._recv()
+        assert len(pubs) == len(pairs)
 
+        encs = []
+        for (x0, x1), (pub_0, pub_1) in zip(pairs, pubs):
+            pub_0 = rsa.PublicKey.load_pkcs1(pub_0, "DER")
+            pub_1 = rsa.PublicKey.load_pkcs1(pub_1, "DER")
+            enc_x0 = rsa.encrypt(encode_value(x0), pub_0)
+            enc_x1 = rsa.encrypt(encode_value(x1), pub_1)
+            encs.append((enc_x0, enc_x1))
+        yield from self._send(encs)
 
-class OTReceiver:
-    def __init__(self, addr, context=None):
-        self.context = context or zmq.Context.instance()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(addr)
+
+class OTReceiver(OTPlayer):
+    socket_type = zmq.REQ
 
     def ask_for(self, b: bool):
-        (pub_key, priv_key) = rsa.newkeys(512)
-        # TODO(zilinzhu) Find a way to create random key without
-        # generating private key.
-        (fake_key, _) = rsa.newkeys(512)
-        if b:
-            pubs = (fake_key, pub_key)
-        else:
-            pubs = (pub_key, fake_key)
-        self._send(pubs[0], zmq.SNDMORE)
-        self._send(pubs[1])
-
-        enc_x0 = self._recv()
-        enc_x1 = self._recv(zmq.RCVMORE)
-        encs = (enc_x0, enc_x1)
-
-        res = pickle.loads(rsa.decrypt(encs[b], priv_key))
+        return self.choose_many([b])[0]
+
+    # Get one value of every pair of the sender with only one round trip.
+    def choose_many(self, bits):
+        return drive(self.choose_many_steps(bits))
+
+    @timed("ot")
+    def choose_many_steps(self, bits):
+        pubs, priv_keys = [], []
+        for b in bits:
+            pub_key, priv_key = rsa.newkeys(512)
+            # TODO(zilinzhu) Find a way to create random key without
+            # generating private key.
+            fake_key, _ = rsa.newkeys(512)
+            pub_key, fake_key = pub_key.save_pkcs1("DER"), fake_key.save_pkcs1("DER")
+            if b:
+                pubs.append((fake_key, pub_key))
+            else:
+                pubs.append((pub_key, fake_key))
+            priv_keys.append(priv_key)
+        yield from self._send(pubs)
+
+        encs = yield from self._recv()
+        res = []
+        for b, enc, priv_key in zip(bits, encs, priv_keys):
+            res.append(decode_value(rsa.decrypt(enc[int(b)], priv_key)))
 
         return res
-
-    def _send(self, data, flag=0):
-        self.socket.send(pickle.dumps(data), flag)
-
-    def _recv(self, flag=0):
-        return pickle.loads(self.socket.recv(flag))
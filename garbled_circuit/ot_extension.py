@@ -0,0 +1,250 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The OT extension from "Extending Oblivious Transfers Efficiently"
+# (Ishai, Kilian, Nissim and Petrank). Only KAPPA base OTs are needed
+# to setup, after which any number of OTs only costs symmetric crypto.
+import hashlib
+import secrets
+
+import numpy as np
+import zmq
+
+from .hashing import LABEL_SIZE, get_gate_hash
+from .metrics import timed
+from .ot import OTPlayer
+from .steps import drive
+
+# Number of the base OTs, which is also the number of bits of a label.
+KAPPA = 8 * LABEL_SIZE
+
+# The 2048-bit MODP group from RFC 3526, used by the base OTs.
+P = int(
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+    "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+    "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05"
+    "98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB"
+    "9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718"
+    "3995497CEA956AE515D2261898FA051015728E5A8AACAA68FFFFFFFFFFFFFFFF",
+    16,
+)
+G = 2
+
+
+def random_exponent():
+    return secrets.randbits(256)
+
+
+def kdf(*xs):
+    h = hashlib.sha256()
+    for x in xs:
+        h.update(x.to_bytes(256, "big"))
+    return h.digest()[:LABEL_SIZE]
+
+
+def prg(seed, nonce, num_byte):
+    return np.frombuffer(
+        hashlib.shake_128(seed + nonce.to_bytes(8, "little")).digest(num_byte),
+        np.uint8,
+    )
+
+
+# Transpose a (KAPPA, num_byte) bit matrix into m rows of KAPPA bits.
+def transpose(rows, m):
+    bits = np.unpackbits(rows, axis=1, bitorder="little")[:, :m]
+    return np.packbits(bits.T, axis=1, bitorder="little")
+
+
+class OTExtensionSender(OTPlayer):
+    socket_type = zmq.REP
+
+    def __init__(self, addr, context=None, gate_hash=None, channel=None, metrics=None):
+        super().__init__(addr, context, channel, metrics)
+        self.gate_hash = self.metrics.instrument(get_gate_hash(gate_hash))
+        # The random choices and the chosen seeds of the base OTs.
+        self.s, self.seeds = None, None
+        # Number of OTs finished, used as the nonce of the PRG
+        # and the tweak of the hash.
+        self.num_ot = 0
+        # The 2 random messages of the precomputed random OTs.
+        self.pads = np.empty((0, 2, LABEL_SIZE), dtype=np.uint8)
+
+    def setup(self):
+        drive(self.setup_steps())
+
+    @timed("ot_setup")
+    def setup_steps(self):
+        # The base OTs, where the sender plays the receiver with random
+        # choices s. This is the "simplest OT" of Chou and Orlandi.
+        A = yield from self._recv()
+        self.s = np.frombuffer(secrets.token_bytes(KAPPA // 8), np.uint8)
+        Bs, self.seeds = [], []
+        for c in np.unpackbits(self.s, bitorder="little"):
+            b = random_exponent()
+            B = pow(G, b, P)
+            if c:
+                B = B * A % P
+            Bs.append(B)
+            self.seeds.append(kdf(A, B, pow(A, b, P)))
+        yield from self._send(Bs)
+
+    # Run m OTs whose messages are random, returns the q matrix
+    # transposed and the tweaks of the m OTs.
+    def _extend(self, m):
+        if self.seeds is None:
+            yield from self.setup_steps()
+        num_byte = (m + 7) // 8
+        u = yield from self._recv()
+        s_bits = np.unpackbits(self.s, bitorder="little").astype(bool)
+        q = np.stack([prg(seed, self.num_ot, num_byte) for seed in self.seeds])
+        q[s_bits] ^= u[s_bits]
+        # Now the row j of q is t_j ^ r_j * s.
+        q = transpose(q, m)
+        tweaks = np.arange(self.num_ot, self.num_ot + m, dtype=np.uint64)
+        self.num_ot += m
+        return q, tweaks
+
+    # Send pairs[j][r_j] to the receiver for a (m, 2, LABEL_SIZE) array,
+    # where r is the choices of the receiver.
+    def transfer_many(self, pairs):
+        drive(self.transfer_many_steps(pairs))
+
+    @timed("ot")
+    def transfer_many_steps(self, pairs):
+        m = len(pairs)
+        if m == 0:
+            return
+        y = np.empty((m, 2, LABEL_SIZE), dtype=np.uint8)
+        if m <= len(self.pads):
+            # Derandomize the precomputed random OTs with the
+            # corrections e = r ^ c from the receiver.
+            e = yield from self._recv()
+            pads, self.pads = self.pads[:m], self.pads[m:]
+            y[:, 0] = pairs[:, 0] ^ pads[np.arange(m), e]
+            y[:, 1] = pairs[:, 1] ^ pads[np.arange(m), 1 - e]
+        else:
+            q, tweaks = yield from self._extend(m)
+            y[:, 0] = pairs[:, 0] ^ self.gate_hash.hash_array(q, tweaks)
+            y[:, 1] = pairs[:, 1] ^ self.gate_hash.hash_array(q ^ self.s, tweaks)
+        yield from self._send(y)
+
+    # Run m random OTs ahead of time, which are used by transfer_many later.
+    def precompute(self, m):
+        drive(self.precompute_steps(m))
+
+    @timed("ot_precompute")
+    def precompute_steps(self, m):
+        if m == 0:
+            return
+        q, tweaks = yield from self._extend(m)
+        pads = np.empty((m, 2, LABEL_SIZE), dtype=np.uint8)
+        pads[:, 0] = self.gate_hash.hash_array(q, tweaks)
+        pads[:, 1] = self.gate_hash.hash_array(q ^ self.s, tweaks)
+        self.pads = np.concatenate([self.pads, pads])
+        yield from self._send("")
+
+
+class OTExtensionReceiver(OTPlayer):
+    socket_type = zmq.REQ
+
+    def __init__(self, addr, context=None, gate_hash=None, channel=None, metrics=None):
+        super().__init__(addr, context, channel, metrics)
+        self.gate_hash = self.metrics.instrument(get_gate_hash(gate_hash))
+        # The 2 seeds of every base OT.
+        self.seeds = None
+        self.num_ot = 0
+        # The random choices and the chosen messages of
+        # the precomputed random OTs.
+        self.choices = np.empty(0, dtype=np.uint8)
+        self.pads = np.empty((0, LABEL_SIZE), dtype=np.uint8)
+
+    def setup(self):
+        drive(self.setup_steps())
+
+    @timed("ot_setup")
+    def setup_steps(self):
+        # The receiver plays the sender of the base OTs.
+        a = random_exponent()
+        A = pow(G, a, P)
+        yield from self._send(A)
+        Bs = yield from self._recv()
+        A_inv = pow(A, -1, P)
+        self.seeds = [
+            (kdf(A, B, pow(B, a, P)), kdf(A, B, pow(B * A_inv % P, a, P))) for B in Bs
+        ]
+
+    # Start m OTs with the choices in bits, returns the t matrix
+    # transposed and the tweaks of the m OTs.
+    def _extend(self, bits):
+        if self.seeds is None:
+            yield from self.setup_steps()
+        m = len(bits)
+        num_byte = (m + 7) // 8
+        r = np.packbits(bits, bitorder="little")
+        t = np.stack([prg(k0, self.num_ot, num_byte) for k0, _ in self.seeds])
+        u = np.stack([prg(k1, self.num_ot, num_byte) for _, k1 in self.seeds])
+        u ^= t ^ r
+        yield from self._send(u)
+        t = transpose(t, m)
+        tweaks = np.arange(self.num_ot, self.num_ot + m, dtype=np.uint64)
+        self.num_ot += m
+        return t, tweaks
+
+    # Get the label chosen by every bit in bits,
+    # returns a (m, LABEL_SIZE) array.
+    def choose_many(self, bits):
+        return drive(self.choose_many_steps(bits))
+
+    @timed("ot")
+    def choose_many_steps(self, bits):
+        m = len(bits)
+        if m == 0:
+            return np.empty((0, LABEL_SIZE), dtype=np.uint8)
+        bits = np.asarray(bits, dtype=np.uint8)
+        if m <= len(self.choices):
+            c, self.choices = self.choices[:m], self.choices[m:]
+            pads, self.pads = self.pads[:m], self.pads[m:]
+            yield from self._send(bits ^ c)
+            y = yield from self._recv()
+            return y[np.arange(m), bits] ^ pads
+        t, tweaks = yield from self._extend(bits)
+        y = yield from self._recv()
+        return y[np.arange(m), bits] ^ self.gate_hash.hash_array(t, tweaks)
+
+    # Run m random OTs with random choices ahead of time,
+    # which are used by choose_many later.
+    def precompute(self, m):
+        drive(self.precompute_steps(m))
+
+    @timed("ot_precompute")
+    def precompute_steps(self, m):
+        if m == 0:
+            return
+        c = np.unpackbits(
+            np.frombuffer(secrets.token_bytes((m + 7) // 8), np.uint8),
+            bitorder="little",
+        )[:m]
+        t, tweaks = yield from self._extend(c)
+        yield from self._recv()
+        self.choices = np.concatenate([self.choices, c])
+        self.pads = np.concatenate([self.pads, self.gate_hash.hash_array(t, tweaks)])
@@ -0,0 +1,194 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import weakref
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .hashing import LABEL_SIZE
+from .metrics import CountingGateHash
+
+# Gates are split into tasks of at least MIN_TASK_SIZE table gates,
+# so that small ranges are not split across the workers.
+MIN_TASK_SIZE = 256
+
+# The garbler of the worker process.
+_garbler = None
+
+
+# Create the garbler of a worker, which is an instance of the class of
+# the garbled circuit with only the state needed for garbling. The keys
+# and the table are in shared memory.
+def _init_worker(cls, state, gate_hash, k_name, table_name, table_shape):
+    global _garbler
+    _garbler = cls.__new__(cls)
+    _garbler.__dict__.update(state)
+    _garbler.gate_hash = gate_hash
+    _garbler._shm = [
+        shared_memory.SharedMemory(name=k_name),
+        shared_memory.SharedMemory(name=table_name),
+    ]
+    _garbler._k = np.ndarray(
+        (_garbler.num_wire, 2, LABEL_SIZE), dtype=np.uint8, buffer=_garbler._shm[0].buf
+    )
+    _garbler._table = np.ndarray(
+        table_shape, dtype=np.uint8, buffer=_garbler._shm[1].buf
+    )
+
+
+# Garble the gates in [start, end) of the schedule, or only the table
+# gates of them if the keys of the free gates are already propagated.
+def _garble_gates(garbler, k, table, start, end, skip_free):
+    R = k[0, 0] ^ k[0, 1]
+    for op, s, e in garbler.schedule.iter_blocks(start, end):
+        if not (skip_free and garbler._is_free(op)):
+            garbler._garble_block(op, s, e, k, table, 0, R)
+
+
+def _garble_task(start, end, skip_free):
+    _garble_gates(_garbler, _garbler._k, _garbler._table, start, end, skip_free)
+
+
+# Stop the workers and free the shared memory of a garbler.
+def _release(executor, shm):
+    executor.shutdown()
+    for segment in shm:
+        segment.close()
+        segment.unlink()
+
+
+# Garble the schedule with the table gates split across a pool of
+# processes. Since garbling is deterministic given the keys, the table is
+# the same as the one garbled by a single process.
+class ParallelGarbler:
+    def __init__(self, gc, num_worker):
+        self.gc = gc
+        self.num_worker = num_worker
+        k_size = gc.num_wire * 2 * LABEL_SIZE
+        table_shape = (gc.num_table_gate, gc.num_row, LABEL_SIZE)
+        self.shm = [
+            shared_memory.SharedMemory(create=True, size=max(k_size, 1)),
+            shared_memory.SharedMemory(
+                create=True, size=max(int(np.prod(table_shape)), 1)
+            ),
+        ]
+        self.k = np.ndarray(
+            (gc.num_wire, 2, LABEL_SIZE), dtype=np.uint8, buffer=self.shm[0].buf
+        )
+        self.table = np.ndarray(table_shape, dtype=np.uint8, buffer=self.shm[1].buf)
+        # Whether the keys of the outputs of all the table gates are
+        # generated up front, which is not the case for half gates.
+        self.pregenerated = len(gc.random_wires) == gc.num_table_gate
+        state = {
+            "scheme": gc.scheme,
+            "num_row": gc.num_row,
+            "num_wire": gc.num_wire,
+            "table_index": gc.table_index,
+            "_schedule": gc.schedule,
+        }
+        # The hash is pickled with its parameters. The workers do not
+        # count its calls in the metrics.
+        gate_hash = gc.gate_hash
+        if isinstance(gate_hash, CountingGateHash):
+            gate_hash = gate_hash.gate_hash
+        self.executor = ProcessPoolExecutor(
+            num_worker,
+            initializer=_init_worker,
+            initargs=(
+                type(gc),
+                state,
+                gate_hash,
+                self.shm[0].name,
+                self.shm[1].name,
+                table_shape,
+            ),
+        )
+        # The workers and the shared memory are released by close, or else
+        # once the garbler is collected or at exit.
+        self._finalizer = weakref.finalize(self, _release, self.executor, self.shm)
+
+    # Split [start, end) into up to num_worker tasks with about the same
+    # number of table gates, and at least MIN_TASK_SIZE of them each.
+    def _split(self, start, end):
+        table_start = self.gc.table_start
+        n = int(table_start[end] - table_start[start])
+        num_task = max(1, min(self.num_worker, n // MIN_TASK_SIZE))
+        targets = table_start[start] + n * np.arange(1, num_task) // num_task
+        bounds = np.searchsorted(table_start[start:end], targets) + start
+        bounds = [start, *bounds.tolist(), end]
+        return [(s, e) for s, e in zip(bounds, bounds[1:]) if s < e]
+
+    # Split [start, end) into stages of tasks, where the tasks of a stage
+    # are garbled at the same time. A level with enough table gates for
+    # 2 tasks is a stage of its own, and the narrower levels in between
+    # are merged into a single task.
+    def _levels(self, start, end):
+        level = self.gc.schedule.level
+        table_start = self.gc.table_start
+        s = run = start
+        for _, _, e in self.gc.schedule.iter_blocks(start, end):
+            if e < end and level[e] == level[s]:
+                continue
+            if table_start[e] - table_start[s] >= 2 * MIN_TASK_SIZE:
+                if run < s:
+                    yield [(run, s)]
+                yield self._split(s, e)
+                run = e
+            s = e
+        if run < end:
+            yield [(run, end)]
+
+    def garble(self, k, start, end):
+        gc = self.gc
+        self.k[:] = k
+        skip_free = self.pregenerated
+        if skip_free:
+            # Once the keys of the free gates are propagated, every table
+            # gate only depends on the keys, so all of them are garbled
+            # at once without a barrier per level.
+            R = k[0, 0] ^ k[0, 1]
+            for op, s, e in gc.schedule.iter_blocks(start, end):
+                if gc._is_free(op):
+                    gc._garble_block(op, s, e, self.k, self.table, 0, R)
+            stages = [self._split(start, end)]
+        else:
+            # The keys of the outputs of the half gates are only known once
+            # the gates are garbled, so the levels are garbled in order.
+            stages = self._levels(start, end)
+        for tasks in stages:
+            if len(tasks) == 1:
+                # A single task is garbled here, without a round trip.
+                _garble_gates(gc, self.k, self.table, *tasks[0], skip_free)
+                continue
+            futures = [
+                self.executor.submit(_garble_task, s, e, skip_free) for s, e in tasks
+            ]
+            wait(futures)
+            for future in futures:
+                future.result()
+        k[:] = self.k
+        table_start = gc.table_start
+        return self.table[table_start[start] : table_start[end]].copy()
+
+    def close(self):
+        self._finalizer()
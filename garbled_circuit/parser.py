@@ -19,11 +19,18 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import itertools
 import logging
+import os
+from array import array
 
+import numpy as np
+
+from .cache import SUFFIX, content_hash, load_circuit, save_circuit
 from .circuit import Circuit
 from .gate import Gate
 from .operation import str2operation, Operation
+from .program import OPCODES, Program, wire_dtype
 
 
 def s2lines(s):
@@ -88,3 +95,93 @@ def parse(s):
     circuit = Circuit(gates, input_sizes, output_sizes, num_wire)
 
     return circuit
+
+
+# The non-empty stripped lines of a file object, read lazily.
+def iter_lines(f):
+    for line in f:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if line != "":
+            yield line
+
+
+def _opcode(name):
+    operation = str2operation(name)
+    if operation == Operation.MAND:
+        return OPCODES[Operation.AND]
+    return OPCODES[operation]
+
+
+# Parse a Bristol fashion circuit from a filename or a file object line by
+# line, without building the Gate objects. The gates are written into
+# compact arrays directly, so the returned circuit only has its program.
+def parse_file(f):
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "rb") as f:
+            return parse_file(f)
+    lines = iter_lines(f)
+
+    num_gate, num_wire = line2ints(next(lines))
+    input_info = line2ints(next(lines))
+    input_sizes = input_info[1:]
+    assert len(input_sizes) == input_info[0]
+    output_info = line2ints(next(lines))
+    output_sizes = output_info[1:]
+    assert len(output_sizes) == output_info[0]
+
+    opcodes = {}
+    typecode = "i" if wire_dtype(num_wire) == np.int32 else "q"
+    op, a, b, c = array("B"), array(typecode), array(typecode), array(typecode)
+    num_line = 0
+    for line in itertools.islice(lines, num_gate):
+        num_line += 1
+        words = line.split()
+        name = words[-1]
+        if name not in opcodes:
+            opcodes[name] = _opcode(name)
+        num_input_wire, num_output_wire = int(words[0]), int(words[1])
+        assert len(words) == 3 + num_input_wire + num_output_wire
+        if name == "MAND":
+            # The k ANDs of a MAND gate are appended at once.
+            assert num_input_wire == 2 * num_output_wire
+            wires = [int(word) for word in words[2:-1]]
+            k = num_output_wire
+            op.extend([opcodes[name]] * k)
+            a.extend(wires[:k])
+            b.extend(wires[k : 2 * k])
+            c.extend(wires[2 * k :])
+            continue
+        assert num_input_wire == 1 or num_input_wire == 2
+        assert num_output_wire == 1
+        op.append(opcodes[name])
+        a.append(int(words[2]))
+        b.append(int(words[3]) if num_input_wire == 2 else -1)
+        c.append(int(words[-2]))
+    assert num_line == num_gate
+    assert next(lines, None) is None
+
+    dtype = wire_dtype(num_wire)
+    program = Program(
+        np.frombuffer(op, dtype=np.uint8),
+        np.frombuffer(a, dtype=dtype),
+        np.frombuffer(b, dtype=dtype),
+        np.frombuffer(c, dtype=dtype),
+    )
+    return Circuit.from_program(program, input_sizes, output_sizes, num_wire)
+
+
+# Load a circuit file with parse_file. If cache_dir is given, the compiled
+# circuit is saved there under the hash of the file content, and later
+# loads memory map the saved file instead of parsing again.
+def load(filename, cache_dir=None):
+    if cache_dir is None:
+        return parse_file(filename)
+    cache_file = os.path.join(cache_dir, content_hash(filename) + SUFFIX)
+    if os.path.exists(cache_file):
+        return load_circuit(cache_file)
+    circuit = parse_file(filename)
+    os.makedirs(cache_dir, exist_ok=True)
+    save_circuit(circuit, cache_file)
+    return circuit
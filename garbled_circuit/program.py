@@ -0,0 +1,271 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import bisect
+
+import numpy as np
+
+from .operation import Operation
+
+# The opcodes of the compiled gates.
+XOR = 0
+AND = 1
+NOT = 2
+EQ = 3
+EQW = 4
+
+OPCODES = {
+    Operation.XOR: XOR,
+    Operation.AND: AND,
+    Operation.NOT: NOT,
+    Operation.EQ: EQ,
+    Operation.EQW: EQW,
+}
+OPERATIONS = {opcode: operation for operation, opcode in OPCODES.items()}
+
+
+# The compiled form of the gates of a circuit, stored as parallel arrays.
+# Gate i computes op[i] of the wires a[i] and b[i] into the wire c[i].
+# b[i] is -1 for gates of a single input, and a[i] is the constant
+# for EQ gates. A MAND gate of k outputs is compiled into k AND gates,
+# which are scheduled like any other gates, so that only the ones of the
+# same level share a block. A scheduled program also has the level of
+# every gate, see levelize.
+class Program:
+    def __init__(self, op, a, b, c, level=None):
+        self.op = op
+        self.a = a
+        self.b = b
+        self.c = c
+        self.level = level
+        self._groups = None
+        self._blocks = None
+
+    @property
+    def num_gate(self):
+        return len(self.op)
+
+    # The indices of the gates of every opcode.
+    @property
+    def groups(self):
+        if self._groups is None:
+            self._groups = {
+                opcode: np.flatnonzero(self.op == opcode) for opcode in OPERATIONS
+            }
+        return self._groups
+
+    # The boundaries of the runs of gates of the same level and opcode.
+    @property
+    def blocks(self):
+        if self._blocks is None:
+            change = self.op[1:] != self.op[:-1]
+            if self.level is not None:
+                change |= self.level[1:] != self.level[:-1]
+            self._blocks = np.concatenate(
+                [[0], np.flatnonzero(change) + 1, [self.num_gate]]
+            ).tolist()
+        return self._blocks
+
+    # Iterate over (op, s, e) of the blocks in [start, end), where the
+    # block [s, e) is clipped to the range. The gates of a block can be
+    # run at once if the program is scheduled.
+    def iter_blocks(self, start=0, end=None):
+        if end is None:
+            end = self.num_gate
+        blocks = self.blocks
+        i = bisect.bisect_right(blocks, start) - 1
+        while i + 1 < len(blocks) and blocks[i] < end:
+            s, e = max(blocks[i], start), min(blocks[i + 1], end)
+            yield int(self.op[s]), s, e
+            i += 1
+
+    # Iterate over (op, a, b, c) of the gates in [start, end) as python ints.
+    def iter(self, start=0, end=None):
+        s = slice(start, end)
+        return zip(
+            self.op[s].tolist(),
+            self.a[s].tolist(),
+            self.b[s].tolist(),
+            self.c[s].tolist(),
+        )
+
+
+def wire_dtype(num_wire):
+    return np.int32 if num_wire < (1 << 31) else np.int64
+
+
+def compile_gates(gates, num_wire):
+    n = sum(gate.num_output for gate in gates)
+    dtype = wire_dtype(num_wire)
+    op = np.empty(n, dtype=np.uint8)
+    a = np.empty(n, dtype=dtype)
+    b = np.full(n, -1, dtype=dtype)
+    c = np.empty(n, dtype=dtype)
+    i = 0
+    for gate in gates:
+        if gate.operation == Operation.MAND:
+            k = gate.num_output
+            op[i : i + k] = AND
+            a[i : i + k] = gate.input_wires[:k]
+            b[i : i + k] = gate.input_wires[k:]
+            c[i : i + k] = gate.output_wires
+            i += k
+            continue
+        op[i] = OPCODES[gate.operation]
+        a[i] = gate.input_wires[0]
+        if gate.num_input == 2:
+            b[i] = gate.input_wires[1]
+        c[i] = gate.output_wires[0]
+        i += 1
+    return Program(op, a, b, c)
+
+
+# Evaluate a single gate on bits, which are python ints or numpy arrays.
+# x is the constant for EQ gates.
+def apply(op, x, y):
+    if op == XOR:
+        return x ^ y
+    elif op == AND:
+        return x & y
+    elif op == NOT:
+        return 1 ^ x
+    elif op == EQ or op == EQW:
+        return x
+    else:
+        raise ValueError(f"Unknown opcode: {op}")
+
+
+# Remap the wires of a program onto a pool of slots, where a slot is
+# reused once the last gate reading its wire has run. For a scheduled
+# program, the slots are only reused from the next level, so that the
+# gates of a level can still run at once. The input wires keep
+# their indices and the output wires are moved to the last slots in order,
+# so the slots are laid out like the wires of a circuit of num_slot wires.
+# Returns the remapped program and num_slot.
+def allocate(program, num_input_wire, output_offset, num_wire):
+    num_gate = program.num_gate
+    index = np.arange(num_gate)
+    reads_a = program.op != EQ
+    reads_b = program.b >= 0
+    # The index of the last gate reading every wire, or -1.
+    last_use = np.full(num_wire, -1, dtype=np.int64)
+    np.maximum.at(last_use, program.a[reads_a], index[reads_a])
+    np.maximum.at(last_use, program.b[reads_b], index[reads_b])
+    last_use = last_use.tolist()
+
+    slot = list(range(num_input_wire)) + [-1] * (num_wire - num_input_wire)
+    free = [w for w in range(num_input_wire) if last_use[w] < 0]
+    released = []
+    level = program.level.tolist() if program.level is not None else range(num_gate)
+    num_work_slot = num_input_wire
+    for i, (op, a, b, c) in enumerate(program.iter()):
+        if i > 0 and level[i] != level[i - 1]:
+            free += released
+            released = []
+        if c < output_offset:
+            if free:
+                slot[c] = free.pop()
+            else:
+                slot[c] = num_work_slot
+                num_work_slot += 1
+            if last_use[c] < 0:
+                released.append(slot[c])
+        # Release the inputs after the output is placed, so that a gate
+        # never writes the slot it reads.
+        if op != EQ and a < output_offset and last_use[a] == i:
+            released.append(slot[a])
+        if b >= 0 and b != a and b < output_offset and last_use[b] == i:
+            released.append(slot[b])
+
+    num_slot = num_work_slot + num_wire - output_offset
+    slot[output_offset:] = range(num_work_slot, num_slot)
+    dtype = wire_dtype(num_slot)
+    slot = np.array(slot + [-1], dtype=dtype)
+    a = np.where(reads_a, slot[program.a], program.a).astype(dtype)
+    return (
+        Program(program.op, a, slot[program.b], slot[program.c], program.level),
+        num_slot,
+    )
+
+
+# Schedule a program by levels, where the level of a gate is one more than
+# the highest level of its input wires and the input wires of the circuit
+# are of level 0. Returns the program with the gates sorted by level and
+# then by opcode, so that every block of the program is a set of
+# independent gates of the same opcode.
+def levelize(program, num_wire):
+    wire_level = [0] * num_wire
+    gate_level = []
+    for op, a, b, c in program.iter():
+        level = wire_level[a] if op != EQ else 0
+        if b >= 0:
+            level = max(level, wire_level[b])
+        wire_level[c] = level + 1
+        gate_level.append(level + 1)
+    level = np.array(gate_level, dtype=np.int32)
+    order = np.lexsort((program.op, level))
+    return Program(
+        program.op[order],
+        program.a[order],
+        program.b[order],
+        program.c[order],
+        level[order],
+    )
+
+
+# The program of n independent copies of a circuit, as a circuit whose
+# inputs are the inputs of copy 0, then of copy 1 and so on, and
+# likewise for the outputs. The gates are ordered copy by copy, or
+# block by block for a scheduled program, so that every block holds
+# the gates of the block in all the copies.
+def replicate(program, n, num_input_wire, output_offset, num_wire):
+    num_middle_wire = output_offset - num_input_wire
+    num_output_wire = num_wire - output_offset
+    dtype = wire_dtype(n * num_wire)
+    t = np.arange(n, dtype=np.int64)[:, None]
+
+    def remap(w):
+        w = w.astype(np.int64)[None, :]
+        return np.select(
+            [w < 0, w < num_input_wire, w < output_offset],
+            [
+                w,
+                t * num_input_wire + w,
+                n * num_input_wire + t * num_middle_wire + w - num_input_wire,
+            ],
+            n * output_offset + t * num_output_wire + w - output_offset,
+        ).astype(dtype)
+
+    a = np.where(program.op == EQ, program.a, remap(program.a))
+    arrays = [
+        np.broadcast_to(program.op, a.shape),
+        a,
+        remap(program.b),
+        remap(program.c),
+    ]
+    if program.level is None:
+        return Program(*[array.ravel() for array in arrays])
+    # Gather the copies of every block.
+    block = np.repeat(np.arange(len(program.blocks) - 1), np.diff(program.blocks))
+    gate = np.broadcast_to(np.arange(program.num_gate), a.shape).ravel()
+    order = np.lexsort((gate, np.repeat(t, program.num_gate), block[gate]))
+    level = np.broadcast_to(program.level, a.shape).ravel()[order]
+    return Program(*[array.ravel()[order] for array in arrays], level)
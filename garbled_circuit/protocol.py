@@ -0,0 +1,122 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The binary format of the messages between the 2 players.
+#
+# Every value starts with a header frame, whose first byte is the kind
+# of the value. Arrays and bytes are followed by a payload frame, which is
+# sent and received without copy, so that large tables are never
+# serialized. A message could hold several values by sending them with
+# zmq.SNDMORE and receiving them one by one.
+import struct
+
+import numpy as np
+import zmq
+
+NONE = 0
+INT = 1
+STR = 2
+BYTES = 3
+ARRAY = 4
+LIST = 5
+
+# Only plain numeric arrays could be received from the peer.
+ARRAY_KINDS = "biu"
+
+
+def encode(data):
+    if data is None:
+        return [struct.pack("<B", NONE)]
+    if isinstance(data, (int, np.integer)) and not isinstance(data, bool):
+        data = int(data)
+        n = (data.bit_length() + 8) // 8
+        return [struct.pack("<B", INT) + data.to_bytes(n, "little", signed=True)]
+    if isinstance(data, str):
+        return [struct.pack("<B", STR) + data.encode("utf-8")]
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return [struct.pack("<B", BYTES), data]
+    if isinstance(data, np.ndarray):
+        if data.dtype.kind not in ARRAY_KINDS:
+            raise ValueError(f"Cannot send array of dtype {data.dtype}.")
+        dtype = data.dtype.str.encode("ascii")
+        header = struct.pack(
+            f"<BB{len(dtype)}sB{data.ndim}Q",
+            ARRAY,
+            len(dtype),
+            dtype,
+            data.ndim,
+            *data.shape,
+        )
+        # The payload is a flat view of the bytes, as the buffer of
+        # an empty array of several dimensions cannot be cast to bytes.
+        return [header, np.ascontiguousarray(data).reshape(-1).view(np.uint8)]
+    if isinstance(data, (list, tuple)):
+        frames = [struct.pack("<BQ", LIST, len(data))]
+        for item in data:
+            frames += encode(item)
+        return frames
+    raise ValueError(f"Cannot send value of type {type(data)}.")
+
+
+# Send a value through a zmq socket, returns the number of bytes sent.
+def send(socket, data, flag=0):
+    frames = encode(data)
+    for frame in frames[:-1]:
+        socket.send(frame, zmq.SNDMORE, copy=False)
+    socket.send(frames[-1], flag, copy=False)
+    return sum(memoryview(frame).nbytes for frame in frames)
+
+
+def recv(socket):
+    return decode(lambda: socket.recv(copy=False).buffer)
+
+
+# Decode a value from its frames, where next_frame returns the next frame
+# as a bytes-like object. The arrays received are read-only views of the
+# frames.
+def decode(next_frame):
+    header = bytes(next_frame())
+    kind = header[0]
+    if kind == NONE:
+        return None
+    if kind == INT:
+        return int.from_bytes(header[1:], "little", signed=True)
+    if kind == STR:
+        return header[1:].decode("utf-8")
+    if kind == BYTES:
+        return bytes(next_frame())
+    if kind == ARRAY:
+        n = header[1]
+        dtype = np.dtype(header[2 : 2 + n].decode("ascii"))
+        if dtype.kind not in ARRAY_KINDS:
+            raise ValueError(f"Received array of invalid dtype {dtype}.")
+        ndim = header[2 + n]
+        shape = struct.unpack_from(f"<{ndim}Q", header, 3 + n)
+        buffer = memoryview(next_frame()).cast("B")
+        if len(buffer) != int(np.prod(shape, dtype=np.int64)) * dtype.itemsize:
+            raise ValueError("Received array of invalid size.")
+        array = np.frombuffer(buffer, dtype).reshape(shape)
+        array.flags.writeable = False
+        return array
+    if kind == LIST:
+        (n,) = struct.unpack_from("<Q", header, 1)
+        return [decode(next_frame) for _ in range(n)]
+    raise ValueError(f"Received value of unknown kind {kind}.")
@@ -0,0 +1,97 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The protocols of the players are written as generators of steps, which
+# yield every message to send or receive, and get back the received value.
+# So the same protocol could be run by blocking on the channels with drive,
+# or by an event loop with drive_async, which never blocks a thread while
+# waiting for the other player:
+#
+#   def protocol(channel):
+#       yield Send(channel, "hello")
+#       return (yield Recv(channel))
+import asyncio
+
+
+class Send:
+    def __init__(self, channel, data, flag=0):
+        self.channel = channel
+        self.data = data
+        self.flag = flag
+
+
+class Recv:
+    def __init__(self, channel, flag=0):
+        self.channel = channel
+        self.flag = flag
+
+
+# A player of a protocol, which sends and receives on self.channel and
+# records every message into self.metrics.
+class Player:
+    def _send(self, data, flag=0):
+        self.metrics.message("sent", data)
+        yield Send(self.channel, data, flag)
+
+    def _recv(self, flag=0):
+        data = yield Recv(self.channel, flag)
+        self.metrics.message("received", data)
+        return data
+
+
+# Run the steps on blocking channels, returns the value of the protocol.
+def drive(steps):
+    value = None
+    while True:
+        try:
+            step = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(step, Send):
+            value = step.channel.send(step.data, step.flag)
+        else:
+            value = step.channel.recv(step.flag)
+
+
+# Advance the steps to the next message, returns whether the protocol
+# finished and the next step or the value of the protocol.
+def _advance(steps, value):
+    try:
+        return False, steps.send(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+# Run the steps on the asynchronous channels of an event loop. The
+# computation between 2 messages, e.g. garbling or the OT, runs on the
+# executor (the default executor of the loop for None), so the number of
+# threads is bounded however many protocols are in flight.
+async def drive_async(steps, executor=None):
+    loop = asyncio.get_running_loop()
+    value = None
+    while True:
+        done, step = await loop.run_in_executor(executor, _advance, steps, value)
+        if done:
+            return step
+        if isinstance(step, Send):
+            value = await step.channel.asend(step.data, step.flag)
+        else:
+            value = await step.channel.arecv(step.flag)
@@ -0,0 +1,380 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The connections between the 2 players. A transport carries the
+# messages of several streams over one connection, and a channel is the
+# end of one stream, which sends and receives the values of the protocol.
+# The garbled circuit and the OT use 2 channels of the same transport.
+#
+# Every method that waits for the other player has an asynchronous variant
+# prefixed with a, used by the protocols driven by an event loop. These
+# need a StreamTransport, zmq sockets of a zmq.asyncio.Context, or an
+# InprocTransport.
+import asyncio
+import socket
+import struct
+import threading
+import time
+from collections import defaultdict, deque
+
+import zmq
+
+from . import protocol
+
+
+class Channel:
+    def __init__(self, transport, stream):
+        self.transport = transport
+        self.stream = stream
+
+    # The flag is only meaningful for zmq sockets, where it groups
+    # several values into one message.
+    def send(self, data, flag=0):
+        self.transport.send(self.stream, protocol.encode(data))
+
+    def recv(self, flag=0):
+        frames = iter(self.transport.recv(self.stream))
+        return protocol.decode(lambda: next(frames))
+
+    async def asend(self, data, flag=0):
+        await self.transport.asend(self.stream, protocol.encode(data))
+
+    async def arecv(self, flag=0):
+        frames = iter(await self.transport.arecv(self.stream))
+        return protocol.decode(lambda: next(frames))
+
+
+# A channel over a zmq socket of its own, e.g. the REQ/REP sockets of the
+# players when they connect with addresses.
+class ZMQChannel:
+    def __init__(self, socket):
+        self.socket = socket
+        self.num_byte_sent = 0
+        # The frames of the message received by arecv that are not decoded
+        # yet, as a message may hold several values.
+        self.frames = deque()
+
+    def send(self, data, flag=0):
+        self.num_byte_sent += protocol.send(self.socket, data, flag)
+
+    def recv(self, flag=0):
+        return protocol.recv(self.socket)
+
+    async def asend(self, data, flag=0):
+        frames = protocol.encode(data)
+        for frame in frames[:-1]:
+            await self.socket.send(frame, zmq.SNDMORE, copy=False)
+        await self.socket.send(frames[-1], flag, copy=False)
+        self.num_byte_sent += sum(memoryview(frame).nbytes for frame in frames)
+
+    async def arecv(self, flag=0):
+        if not self.frames:
+            self.frames.extend(
+                frame.buffer for frame in await self.socket.recv_multipart(copy=False)
+            )
+        return protocol.decode(self.frames.popleft)
+
+
+# A message is a list of frames. The messages of the other streams that
+# arrive while waiting for one stream are kept until they are received.
+class Transport:
+    def __init__(self):
+        self.pending = defaultdict(deque)
+        self.num_byte_sent = 0
+
+    def channel(self, stream):
+        return Channel(self, stream)
+
+    def send(self, stream, frames):
+        self.num_byte_sent += sum(memoryview(frame).nbytes for frame in frames)
+        self._send(stream, frames)
+
+    def recv(self, stream):
+        while not self.pending[stream]:
+            other, frames = self._recv()
+            self.pending[other].append(frames)
+        return self.pending[stream].popleft()
+
+    async def asend(self, stream, frames):
+        self.num_byte_sent += sum(memoryview(frame).nbytes for frame in frames)
+        await self._asend(stream, frames)
+
+    async def arecv(self, stream):
+        while not self.pending[stream]:
+            other, frames = await self._arecv()
+            self.pending[other].append(frames)
+        return self.pending[stream].popleft()
+
+    def close(self):
+        pass
+
+    def _send(self, stream, frames):
+        raise NotImplementedError
+
+    def _recv(self):
+        raise NotImplementedError
+
+    async def _asend(self, stream, frames):
+        raise NotImplementedError
+
+    async def _arecv(self):
+        raise NotImplementedError
+
+
+# The messages to an end of an in-process connection, which are waited
+# for by blocking a thread, or by the future of an event loop, which is
+# woken up from any thread without holding a thread while waiting.
+class _Inbox:
+    def __init__(self):
+        self.ready = threading.Condition()
+        self.messages = deque()
+        self.waiters = []
+
+    def put(self, message):
+        with self.ready:
+            self.messages.append(message)
+            self.ready.notify()
+            waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def get(self):
+        with self.ready:
+            while not self.messages:
+                self.ready.wait()
+            return self.messages.popleft()
+
+    async def aget(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.ready:
+                if self.messages:
+                    return self.messages.popleft()
+                future = loop.create_future()
+                self.waiters.append((loop, future))
+            await future
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# The 2 ends of an in-process connection, e.g. for tests and benchmarks
+# that run both players in one process, in threads or on event loops.
+# The frames are passed without copy, so a sent array must not be
+# modified by the sender afterwards.
+class InprocTransport(Transport):
+    def __init__(self, inbox, outbox):
+        super().__init__()
+        self.inbox = inbox
+        self.outbox = outbox
+
+    @staticmethod
+    def pair():
+        a, b = _Inbox(), _Inbox()
+        return InprocTransport(a, b), InprocTransport(b, a)
+
+    def _send(self, stream, frames):
+        self.outbox.put((stream, frames))
+
+    def _recv(self):
+        return self.inbox.get()
+
+    async def _asend(self, stream, frames):
+        self._send(stream, frames)
+
+    async def _arecv(self):
+        return await self.inbox.aget()
+
+
+# Every message over a byte stream is written as its stream, its number
+# of frames and their sizes followed by the frames.
+HEADER = "<BI"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+
+def pack_message(stream, frames):
+    frames = [memoryview(frame).cast("B") for frame in frames]
+    return [
+        struct.pack(f"{HEADER}{len(frames)}Q", stream, len(frames), *map(len, frames))
+    ] + frames
+
+
+# A raw TCP stream. Every message is written as its stream, its number of
+# frames and their sizes followed by the frames, through a large buffer
+# that is flushed once per message.
+class TCPTransport(Transport):
+    def __init__(self, sock, buffer_size=1 << 20):
+        super().__init__()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.writer = sock.makefile("wb", buffering=buffer_size)
+        self.reader = sock.makefile("rb", buffering=buffer_size)
+
+    # Accept a connection at host and port. With port 0, the system
+    # picks a free port, which is passed to bound(port) before waiting,
+    # e.g. to tell the other player where to connect.
+    @classmethod
+    def listen(cls, host, port, bound=None, **kwargs):
+        with socket.create_server((host, port)) as server:
+            if bound is not None:
+                bound(server.getsockname()[1])
+            sock, _ = server.accept()
+        return cls(sock, **kwargs)
+
+    # Connect to a player that listens, which may not have started yet.
+    @classmethod
+    def connect(cls, host, port, timeout=10, **kwargs):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return cls(socket.create_connection((host, port)), **kwargs)
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+
+    def _send(self, stream, frames):
+        for data in pack_message(stream, frames):
+            self.writer.write(data)
+        self.writer.flush()
+
+    def _recv(self):
+        stream, n = struct.unpack(HEADER, self._read(HEADER_SIZE))
+        sizes = struct.unpack(f"<{n}Q", self._read(8 * n))
+        return stream, [self._read(size) for size in sizes]
+
+    # A blocking socket would hold a thread for every pending receive,
+    # so an event loop talks to a TCPTransport through a StreamTransport.
+    async def _asend(self, stream, frames):
+        raise NotImplementedError(
+            "TCPTransport is blocking, use StreamTransport with an event loop."
+        )
+
+    async def _arecv(self):
+        raise NotImplementedError(
+            "TCPTransport is blocking, use StreamTransport with an event loop."
+        )
+
+    def _read(self, n):
+        data = bytearray(n)
+        if self.reader.readinto(data) != n:
+            raise ConnectionError("Connection closed by the other player.")
+        return data
+
+    def close(self):
+        self.writer.close()
+        self.reader.close()
+        self.sock.close()
+
+
+# A zmq PAIR socket, where every message is sent as a multipart
+# message whose first frame is the stream.
+class ZMQTransport(Transport):
+    def __init__(self, socket):
+        super().__init__()
+        self.socket = socket
+
+    @classmethod
+    def bind(cls, addr, context=None):
+        socket = (context or zmq.Context.instance()).socket(zmq.PAIR)
+        socket.bind(addr)
+        return cls(socket)
+
+    @classmethod
+    def connect(cls, addr, context=None):
+        socket = (context or zmq.Context.instance()).socket(zmq.PAIR)
+        socket.connect(addr)
+        return cls(socket)
+
+    # The address the socket is bound to, with the port picked by the
+    # system when bound to a wildcard port, e.g. "tcp://127.0.0.1:*".
+    @property
+    def endpoint(self):
+        return self.socket.getsockopt_string(zmq.LAST_ENDPOINT)
+
+    def _send(self, stream, frames):
+        self.socket.send_multipart([struct.pack("<B", stream)] + frames, copy=False)
+
+    def _recv(self):
+        return self._unpack(self.socket.recv_multipart(copy=False))
+
+    async def _asend(self, stream, frames):
+        await self.socket.send_multipart(
+            [struct.pack("<B", stream)] + frames, copy=False
+        )
+
+    async def _arecv(self):
+        return self._unpack(await self.socket.recv_multipart(copy=False))
+
+    def _unpack(self, frames):
+        return frames[0].bytes[0], [frame.buffer for frame in frames[1:]]
+
+    def close(self):
+        self.socket.close()
+
+
+# The asyncio streams of a TCP connection, which could only be used by
+# the protocols driven by an event loop. Messages are framed as in
+# TCPTransport, so the 2 transports could talk to each other.
+class StreamTransport(Transport):
+    def __init__(self, reader, writer):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+
+    # Serve every connection accepted at host and port by the coroutine
+    # handler(transport), returns the asyncio server.
+    @classmethod
+    async def serve(cls, handler, host, port, **kwargs):
+        return await asyncio.start_server(
+            lambda reader, writer: handler(cls(reader, writer)), host, port, **kwargs
+        )
+
+    # Connect to a player that listens, which may not have started yet.
+    @classmethod
+    async def connect(cls, host, port, timeout=10, **kwargs):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return cls(*await asyncio.open_connection(host, port, **kwargs))
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.01)
+
+    async def _asend(self, stream, frames):
+        self.writer.writelines(pack_message(stream, frames))
+        await self.writer.drain()
+
+    async def _arecv(self):
+        try:
+            stream, n = struct.unpack(
+                HEADER, await self.reader.readexactly(HEADER_SIZE)
+            )
+            sizes = struct.unpack(f"<{n}Q", await self.reader.readexactly(8 * n))
+            return stream, [await self.reader.readexactly(size) for size in sizes]
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Connection closed by the other player.")
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,78 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import queue
+import threading
+
+from garbled_circuit.gc import GarbledCircuit
+from garbled_circuit.parser import parse
+from garbled_circuit.transport import InprocTransport
+
+
+def read_circuit_from_file(filename):
+    with open(filename) as f:
+        s = f.read()
+    circuit = parse(s)
+    return circuit
+
+
+# A player of run_players, which builds the garbled circuit of role with
+# the keyword arguments of GarbledCircuit, and returns evaluate(p, inputs),
+# by default the outputs of p(inputs).
+def player(circuit, role, inputs, evaluate=None, **kwargs):
+    def run(transport):
+        p = GarbledCircuit(circuit, role=role, transport=transport, **kwargs)
+        if evaluate is None:
+            return p(inputs)
+        return evaluate(p, inputs)
+
+    return run
+
+
+# Run the 2 players over a pair of in-process transports, each in a
+# daemon thread, so that a player that fails or hangs never blocks the
+# test. Every player is a function of its transport, returns the results
+# of the sender and the receiver, or raises the first error of a player.
+def run_players(sender, receiver, timeout=600):
+    transports = InprocTransport.pair()
+    results = {}
+    done = queue.SimpleQueue()
+
+    def run(name, player, transport):
+        try:
+            results[name] = player(transport)
+            done.put(None)
+        except BaseException as e:
+            done.put(e)
+
+    for args in [
+        ("sender", sender, transports[0]),
+        ("receiver", receiver, transports[1]),
+    ]:
+        threading.Thread(target=run, args=args, daemon=True).start()
+    for _ in range(2):
+        try:
+            error = done.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"The players did not finish in {timeout} seconds.")
+        if error is not None:
+            raise error
+    return results["sender"], results["receiver"]
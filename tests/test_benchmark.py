@@ -0,0 +1,46 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+
+from garbled_circuit.benchmark import main
+
+PHASES = [
+    "parse",
+    "label_generation",
+    "garble",
+    "ot",
+    "table_transfer",
+    "evaluate",
+    "decode",
+    "plaintext",
+]
+
+results = main(["--circuit", "adder64", "zero_equal", "--repeat", "2"])
+json.dumps(results)
+for name in ["adder64", "zero_equal"]:
+    phases = results["circuits"][name]
+    assert list(phases) == PHASES
+    for phase in phases.values():
+        assert phase["per_second"] > 0
+        assert 0 < phase["latency"]["p50"] <= phase["latency"]["p99"]
+    assert phases["table_transfer"]["bytes_sent"] > 0
+    assert phases["ot"]["bytes_sent"] > 0
@@ -42,3 +42,26 @@ assert len(outputs) == 1
 assert outputs[0].val == a + b
 for output in outputs:
     print(output)
+
+# Evaluate a batch of inputs at once.
+a = [15, -3, 1 << 40, 0]
+b = [26, 100, 1 << 40, -1]
+outputs = circuit.evaluate_batch([a, b])
+assert len(outputs) == 1
+assert list(outputs[0]) == [x + y for x, y in zip(a, b)]
+print(outputs[0])
+
+# The wires are evaluated on far fewer reused slots.
+circuit = read_circuit_from_file("circuit/basic/mult64.txt")
+program, num_slot = circuit.slots
+assert num_slot < circuit.num_wire // 4
+outputs = circuit([Int(a[0]), Int(-b[1])])
+assert outputs[0].val == -a[0] * b[1]
+print(f"{circuit.num_wire} wires on {num_slot} slots")
+
+# The schedule runs the gates by blocks of independent gates.
+schedule = circuit.schedule
+assert (schedule.level[1:] >= schedule.level[:-1]).all()
+assert len(schedule.blocks) < circuit.num_gate // 10
+num_block = len(schedule.blocks) - 1
+print(f"{circuit.num_gate} gates in {num_block} blocks of {schedule.level[-1]} levels")
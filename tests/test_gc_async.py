@@ -0,0 +1,189 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import zmq.asyncio
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role, Session
+from garbled_circuit.transport import (
+    InprocTransport,
+    StreamTransport,
+    TCPTransport,
+    ZMQTransport,
+)
+from helpers import read_circuit_from_file
+
+filename = "circuit/basic/adder64.txt"
+circuit = read_circuit_from_file(filename)
+
+# The number of the sessions in flight at the same time.
+NUM_SESSION = 10
+# All the garbling, OT and evaluation of the sessions share 4 threads.
+executor = ThreadPoolExecutor(4)
+
+
+async def run_receiver(transport, outputs):
+    session = Session(
+        Role.RECEIVER, scheme=GarblingScheme.HALF_GATES, transport=transport
+    )
+    session.register("adder64", circuit)
+    # The sender sends its index first.
+    i = await transport.channel(0).arecv()
+    outputs[i] = await session.run("adder64", [PlaceHolder(), Int(-i)], executor)
+    transport.close()
+
+
+async def run_sender(i, port):
+    transport = await StreamTransport.connect("127.0.0.1", port)
+    session = Session(
+        Role.SENDER, scheme=GarblingScheme.HALF_GATES, transport=transport
+    )
+    session.register("adder64", circuit)
+    await transport.channel(0).asend(i)
+    outputs = await session.run("adder64", [Int(3 * i), PlaceHolder()], executor)
+    transport.close()
+    return outputs
+
+
+async def run_sessions():
+    outputs = {}
+    server = await StreamTransport.serve(
+        lambda transport: run_receiver(transport, outputs), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    results = await asyncio.gather(*[run_sender(i, port) for i in range(NUM_SESSION)])
+    server.close()
+    await server.wait_closed()
+    while len(outputs) < NUM_SESSION:
+        await asyncio.sleep(0.01)
+    return outputs, results
+
+
+outputs, results = asyncio.run(run_sessions())
+for i in range(NUM_SESSION):
+    assert outputs[i][0].val == 2 * i
+    assert results[i][0].val == 2 * i
+print(f"{NUM_SESSION} sessions in flight on one event loop.")
+
+
+# The zmq sockets of a zmq.asyncio context, with the in-process
+# addresses of the players or with a PAIR socket shared by the circuit
+# and the OT.
+async def run_zmq(players):
+    results = await asyncio.gather(
+        players[0].run([Int(301), PlaceHolder()], executor),
+        players[1].run([PlaceHolder(), Int(-26)], executor),
+    )
+    for outputs in results:
+        assert outputs[0].val == 275
+    print(results[1][0])
+
+
+context = zmq.asyncio.Context()
+for ot_extension in [True, False]:
+    players = [
+        GarbledCircuit(
+            circuit,
+            role=role,
+            addr=f"inproc://gc-{ot_extension}",
+            ot_addr=f"inproc://ot-{ot_extension}",
+            context=context,
+            scheme=GarblingScheme.HALF_GATES,
+            ot_extension=ot_extension,
+        )
+        for role in [Role.RECEIVER, Role.SENDER]
+    ][::-1]
+    asyncio.run(run_zmq(players))
+    for p in players:
+        p.channel.socket.close()
+        p.ot.channel.socket.close()
+
+receiver = ZMQTransport.bind("tcp://127.0.0.1:*", context)
+players = [
+    GarbledCircuit(
+        circuit,
+        role=Role.SENDER,
+        scheme=GarblingScheme.HALF_GATES,
+        transport=ZMQTransport.connect(receiver.endpoint, context),
+    ),
+    GarbledCircuit(
+        circuit,
+        role=Role.RECEIVER,
+        scheme=GarblingScheme.HALF_GATES,
+        transport=receiver,
+    ),
+]
+asyncio.run(run_zmq(players))
+
+
+# Many more in-process sessions than the threads of the executor,
+# as a session waiting for the other player holds no thread.
+NUM_INPROC_SESSION = 12
+
+
+async def run_inproc():
+    runs = []
+    for i in range(NUM_INPROC_SESSION):
+        transports = InprocTransport.pair()
+        sender, receiver = (
+            GarbledCircuit(
+                circuit,
+                role=role,
+                scheme=GarblingScheme.HALF_GATES,
+                transport=transport,
+            )
+            for role, transport in zip([Role.SENDER, Role.RECEIVER], transports)
+        )
+        runs.append(sender.run([Int(3 * i), PlaceHolder()], executor))
+        runs.append(receiver.run([PlaceHolder(), Int(-i)], executor))
+    results = await asyncio.gather(*runs)
+    for i in range(NUM_INPROC_SESSION):
+        assert results[2 * i][0].val == results[2 * i + 1][0].val == 2 * i
+
+
+asyncio.run(run_inproc())
+print(f"{NUM_INPROC_SESSION} in-process sessions on {executor._max_workers} threads.")
+
+# A blocking TCPTransport can not be driven by an event loop.
+listener = {}
+port = queue.SimpleQueue()
+thread = threading.Thread(
+    target=lambda: listener.update(
+        transport=TCPTransport.listen("127.0.0.1", 0, bound=port.put)
+    )
+)
+thread.start()
+transports = [TCPTransport.connect("127.0.0.1", port.get())]
+thread.join()
+transports.append(listener["transport"])
+try:
+    asyncio.run(transports[0].channel(0).asend("hello"))
+    raise AssertionError("sent on a TCPTransport from an event loop")
+except NotImplementedError as e:
+    print(e)
+for transport in transports:
+    transport.close()
+executor.shutdown()
@@ -0,0 +1,80 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import random
+
+from garbled_circuit.basic_types import PlaceHolder
+from garbled_circuit.gc import BATCH_CACHE_SIZE, GarbledCircuit, GarblingScheme, Role
+
+from helpers import player, read_circuit_from_file, run_players
+
+options = {
+    "evaluate": GarbledCircuit.evaluate_batch,
+    "scheme": GarblingScheme.HALF_GATES,
+}
+
+filename = "circuit/basic/adder64.txt"
+circuit = read_circuit_from_file(filename)
+
+n = 1000
+a = [random.randrange(-(1 << 62), 1 << 62) for _ in range(n)]
+b = [random.randrange(-(1 << 62), 1 << 62) for _ in range(n)]
+
+sender_outputs, outputs = run_players(
+    player(circuit, Role.SENDER, [a, PlaceHolder()], **options),
+    player(circuit, Role.RECEIVER, [PlaceHolder(), b], **options),
+)
+
+assert list(outputs[0]) == [x + y for x, y in zip(a, b)]
+assert list(sender_outputs[0]) == list(outputs[0])
+print(outputs[0][:4])
+
+# Only the receiver has inputs.
+filename = "circuit/basic/neg64.txt"
+circuit = read_circuit_from_file(filename)
+
+sender_outputs, outputs = run_players(
+    player(circuit, Role.SENDER, [PlaceHolder()], **options),
+    player(circuit, Role.RECEIVER, [[1, 2, 3]], **options),
+)
+
+assert list(outputs[0]) == [-1, -2, -3]
+assert list(sender_outputs[0]) == [-1, -2, -3]
+print(outputs[0])
+
+
+# Only the garbled circuits of the last BATCH_CACHE_SIZE batch sizes are kept.
+def evaluate_sizes(p, sizes):
+    outputs = []
+    for n in sizes:
+        inputs = [list(range(n))] if p.role == Role.RECEIVER else [PlaceHolder()]
+        outputs.append(list(p.evaluate_batch(inputs)[0]))
+    assert list(p.batches) == sizes[-BATCH_CACHE_SIZE:]
+    return outputs
+
+
+sizes = [1, 2, 3, 1, 4, 5, 6]
+options["evaluate"] = evaluate_sizes
+sender_outputs, outputs = run_players(
+    player(circuit, Role.SENDER, sizes, **options),
+    player(circuit, Role.RECEIVER, sizes, **options),
+)
+assert outputs == sender_outputs == [[-i for i in range(n)] for n in sizes]
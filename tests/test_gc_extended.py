@@ -0,0 +1,155 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import threading
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gate import Gate
+from garbled_circuit.gc import GarblingScheme, Role, Session
+from garbled_circuit.operation import Operation
+from garbled_circuit.parser import parse, parse_file
+from garbled_circuit.program import AND, NOT, XOR
+from garbled_circuit.transport import InprocTransport
+from helpers import read_circuit_from_file
+
+
+# Rewrite a circuit in the Extended Bristol Fashion, where the AND gates
+# of every level are packed into a single MAND gate.
+def to_extended(circuit):
+    schedule = circuit.schedule
+    lines = []
+    for op, s, e in schedule.iter_blocks():
+        a, b, c = (
+            schedule.a[s:e].tolist(),
+            schedule.b[s:e].tolist(),
+            schedule.c[s:e].tolist(),
+        )
+        if op == AND:
+            wires = " ".join(map(str, a + b + c))
+            lines.append(f"{2 * (e - s)} {e - s} {wires} MAND")
+        for i in range(e - s):
+            if op == XOR:
+                lines.append(f"2 1 {a[i]} {b[i]} {c[i]} XOR")
+            elif op == NOT:
+                lines.append(f"1 1 {a[i]} {c[i]} INV")
+    header = [
+        f"{len(lines)} {circuit.num_wire}",
+        " ".join(map(str, [circuit.num_input] + circuit.input_sizes)),
+        " ".join(map(str, [circuit.num_output] + circuit.output_sizes)),
+        "",
+    ]
+    return "\n".join(header + lines)
+
+
+# The outputs are [~(x0 & y0), x1 & y1, 0, 1] for the inputs x and y of 2 bits.
+SMALL = """7 12
+2 2 2
+1 4
+
+1 1 1 4 EQ
+4 2 0 1 2 3 5 6 MAND
+2 1 5 4 7 XOR
+1 1 7 8 EQW
+1 1 6 9 EQW
+1 1 0 10 EQ
+1 1 4 11 EQW
+"""
+
+
+def small(x, y):
+    return (1 - (x & y & 1)) | (x & y & 2) | 8
+
+
+assert Gate(Operation.MAND, [0, 1, 2, 3, 4, 5], [6, 7, 8])(
+    [True, True, False, True, False, True]
+) == [
+    True,
+    False,
+    False,
+]
+assert Gate(Operation.EQ, [1], [2])([None]) == [True]
+assert Gate(Operation.EQW, [1], [2])([False]) == [False]
+
+mult64 = read_circuit_from_file("circuit/basic/mult64.txt")
+extended = to_extended(mult64)
+circuits = {
+    "small": parse(SMALL),
+    "neg64": read_circuit_from_file("circuit/basic/neg64.txt"),
+    "mult64": parse(extended),
+    "mult64_file": parse_file(io.BytesIO(extended.encode())),
+}
+# A MAND gate is compiled into one AND gate per output.
+assert len(circuits["mult64"].gates) < mult64.num_gate
+assert (
+    circuits["mult64"].num_gate == circuits["mult64_file"].num_gate == mult64.num_gate
+)
+print(f"{mult64.num_gate} gates on {len(circuits['mult64'].gates)} lines")
+
+x, y = [0, 1, 2, 3, 3], [3, 3, 2, 1, 0]
+for i in range(len(x)):
+    assert circuits["small"]([Int(x[i]), Int(y[i])])[0].val == small(x[i], y[i])
+assert list(circuits["small"].evaluate_batch([x, y])[0]) == [
+    small(x[i], y[i]) for i in range(len(x))
+]
+assert circuits["neg64"]([Int(1234)])[0].val == -1234
+assert list(circuits["neg64"].evaluate_batch([[5, -7, 0]])[0]) == [-5, 7, 0]
+for name in ["mult64", "mult64_file"]:
+    assert circuits[name]([Int(-301), Int(26)])[0].val == -301 * 26
+    assert list(circuits[name].evaluate_batch([[3, -4], [5, 6]])[0]) == [15, -24]
+
+# The sender owns the first input and the receiver the second one.
+requests = [
+    ("small", 2, 3),
+    ("small", 1, 1),
+    ("neg64", 0, 1234),
+    ("mult64", -301, 26),
+    ("mult64_file", 7, 8),
+]
+
+
+def run_sender(transport, scheme, results):
+    session = Session(Role.SENDER, scheme=scheme, transport=transport)
+    for name, circuit in circuits.items():
+        session.register(name, circuit)
+    for name, x, _ in requests:
+        inputs = [Int(x), PlaceHolder()] if name != "neg64" else [PlaceHolder()]
+        results.append(session.evaluate(name, inputs)[0].val)
+
+
+for scheme in GarblingScheme:
+    transports = InprocTransport.pair()
+    results = []
+    sender = threading.Thread(target=run_sender, args=(transports[0], scheme, results))
+    sender.start()
+
+    session = Session(Role.RECEIVER, scheme=scheme, transport=transports[1])
+    for name, circuit in circuits.items():
+        session.register(name, circuit)
+    outputs = []
+    for name, _, y in requests:
+        inputs = [PlaceHolder(), Int(y)] if name != "neg64" else [Int(y)]
+        outputs.append(session.evaluate(name, inputs)[0].val)
+    sender.join()
+
+    expected = [small(2, 3), small(1, 1), -1234, -301 * 26, 56]
+    assert outputs == expected and results == expected
+    print(scheme, expected)
@@ -0,0 +1,66 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarblingScheme, Role
+from garbled_circuit.hashing import LABEL_SIZE
+from garbled_circuit.program import AND
+
+from helpers import player, read_circuit_from_file, run_players
+
+
+def evaluate(p, inputs):
+    # Every AND gate has an entry of 2 rows in the table.
+    num_and = int((p.schedule.op == AND).sum())
+    assert p.num_row == 2
+    assert p.num_table_gate == num_and
+    if p.role == Role.SENDER:
+        table = p.create_garbled_table(p.generate_keys())
+        assert table.shape == (num_and, 2, LABEL_SIZE)
+    return p(inputs)
+
+
+filename = "circuit/basic/mult64.txt"
+circuit = read_circuit_from_file(filename)
+
+a = 301
+b = 26
+
+sender_outputs, outputs = run_players(
+    player(
+        circuit,
+        Role.SENDER,
+        [Int(a), PlaceHolder()],
+        evaluate,
+        scheme=GarblingScheme.HALF_GATES,
+    ),
+    player(
+        circuit,
+        Role.RECEIVER,
+        [PlaceHolder(), Int(b)],
+        evaluate,
+        scheme=GarblingScheme.HALF_GATES,
+    ),
+)
+
+assert outputs[0].val == a * b
+assert sender_outputs[0].val == a * b
+print(outputs[0])
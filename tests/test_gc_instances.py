@@ -0,0 +1,118 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import tempfile
+import threading
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role
+from garbled_circuit.instances import load_instance
+from garbled_circuit.transport import InprocTransport
+from helpers import read_circuit_from_file
+
+
+def run_sender(circuit, transport, values, results, chunk_size):
+    p1 = GarbledCircuit(
+        circuit,
+        role=Role.SENDER,
+        scheme=GarblingScheme.HALF_GATES,
+        transport=transport,
+        chunk_size=chunk_size,
+        instance_dir=instance_dir,
+    )
+    results["sender"] = []
+    for a in values:
+        results["sender"].append(p1([Int(a), PlaceHolder()]))
+        results["num_instance"].append(len(p1.instances))
+
+
+filename = "circuit/basic/adder64.txt"
+circuit = read_circuit_from_file(filename)
+instance_dir = tempfile.mkdtemp()
+
+# Garble the instances ahead of time in an offline session.
+offline = GarbledCircuit(
+    circuit,
+    role=Role.SENDER,
+    scheme=GarblingScheme.HALF_GATES,
+    instance_dir=instance_dir,
+)
+filenames = offline.save_instances(3)
+assert len(offline.instances) == 3
+fingerprint, garbled_table, decoding_table, input_keys = load_instance(filenames[0])
+assert garbled_table.shape == (offline.num_table_gate, 2, 16)
+assert decoding_table.shape == (64, 2, 16) and input_keys.shape == (128, 2, 16)
+assert not garbled_table.flags.writeable
+
+# The instances are used by a new sender, without any change of the
+# receiver, until there is none left.
+values = [(301, -26), (5, 7), (-8, 100), (1 << 40, 1)]
+for chunk_size in [None, 1000]:
+    if chunk_size is not None:
+        offline.save_instances(2)
+    transports = InprocTransport.pair()
+    results = {"num_instance": []}
+    sender = threading.Thread(
+        target=run_sender,
+        args=(circuit, transports[0], [a for a, _ in values], results, chunk_size),
+    )
+    sender.start()
+
+    p2 = GarbledCircuit(
+        circuit,
+        role=Role.RECEIVER,
+        scheme=GarblingScheme.HALF_GATES,
+        transport=transports[1],
+        chunk_size=chunk_size,
+    )
+    for i, (a, b) in enumerate(values):
+        outputs = p2([PlaceHolder(), Int(b)])
+        assert outputs[0].val == a + b
+    sender.join()
+
+    for (a, b), outputs in zip(values, results["sender"]):
+        assert outputs[0].val == a + b
+    print(chunk_size, results["num_instance"])
+    assert results["num_instance"] == (
+        [2, 1, 0, 0] if chunk_size is None else [1, 0, 0, 0]
+    )
+
+# An instance is removed once it is taken.
+assert os.listdir(offline.instances.directory) == []
+
+with open(os.path.join(instance_dir, "invalid.gci"), "wb") as f:
+    f.write(b"GCPROG\x00\x01")
+try:
+    load_instance(os.path.join(instance_dir, "invalid.gci"))
+    raise AssertionError("loaded an invalid instance")
+except ValueError as e:
+    print(e)
+
+# A circuit without instance_dir has nowhere to save its instances.
+try:
+    GarbledCircuit(circuit, session=offline.session).save_instances(1)
+    raise AssertionError("saved instances without instance_dir")
+except ValueError as e:
+    print(e)
+
+shutil.rmtree(instance_dir)
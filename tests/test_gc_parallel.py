@@ -0,0 +1,118 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import gc
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role, Session
+from garbled_circuit.hashing import AESGateHash
+
+from helpers import read_circuit_from_file, run_players
+
+
+def run_sender(transport):
+    p1 = GarbledCircuit(
+        circuit,
+        role=Role.SENDER,
+        scheme=GarblingScheme.HALF_GATES,
+        num_worker=2,
+        transport=transport,
+    )
+    outputs = p1([Int(a), PlaceHolder()])
+
+    # The parallel garbler gives the same table as the serial one.
+    k = p1.generate_keys()
+    parallel_k = k.copy()
+    parallel_table = p1.create_garbled_table(parallel_k)
+    p1.close()
+    assert np.array_equal(parallel_table, p1.create_garbled_table(k))
+    assert np.array_equal(k, parallel_k)
+    return outputs
+
+
+def run_receiver(transport):
+    p2 = GarbledCircuit(
+        circuit,
+        role=Role.RECEIVER,
+        scheme=GarblingScheme.HALF_GATES,
+        transport=transport,
+    )
+    return p2([PlaceHolder(), Int(b)])
+
+
+filename = "circuit/basic/mult64.txt"
+circuit = read_circuit_from_file(filename)
+
+a = 301
+b = -26
+
+sender_outputs, outputs = run_players(run_sender, run_receiver)
+
+assert outputs[0].val == a * b
+assert sender_outputs[0].val == a * b
+print(outputs[0])
+
+# The workers garble with the same hash as the sender, a keyed one here,
+# and give the same table in every scheme, in one run or in chunks.
+for scheme in GarblingScheme:
+    session = Session(Role.SENDER, scheme=scheme, gate_hash=AESGateHash(key=bytes(16)))
+    serial = session.register("serial", circuit)
+    parallel = session.register("parallel", circuit, num_worker=2)
+    k = serial.generate_keys()
+    parallel_k = k.copy()
+    assert np.array_equal(
+        parallel.create_garbled_table(parallel_k), serial.create_garbled_table(k)
+    )
+    assert np.array_equal(k, parallel_k)
+    k = serial.generate_keys()
+    parallel_k = k.copy()
+    for start in range(0, serial.num_gate, 1000):
+        end = min(start + 1000, serial.num_gate)
+        assert np.array_equal(
+            parallel.garble(parallel_k, start, end), serial.garble(k, start, end)
+        )
+    # Closing the session stops the workers of its circuits.
+    names = [shm.name for shm in parallel.garbler.shm]
+    session.close()
+    assert parallel.garbler is None
+    print(scheme)
+
+
+def is_freed(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+        return False
+    except FileNotFoundError:
+        return True
+
+
+assert all(is_freed(name) for name in names)
+
+# The shared memory of a garbler that is never closed is freed once the
+# circuit is collected.
+parallel = Session(Role.SENDER).register("parallel", circuit, num_worker=2)
+names = [shm.name for shm in parallel.garbler.shm]
+del parallel
+gc.collect()
+assert all(is_freed(name) for name in names)
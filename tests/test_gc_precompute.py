@@ -0,0 +1,72 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarblingScheme, Role
+
+from helpers import player, read_circuit_from_file, run_players
+
+
+def evaluate(p, inputs):
+    # The number of the OTs is only known after the first evaluation.
+    try:
+        p.precompute(1)
+        raise AssertionError("precomputed without num_ot")
+    except ValueError:
+        pass
+    assert p.precompute(3, num_ot=64) == 2
+    assert len(p.pool) == 2
+    outputs = [p(x) for x in inputs]
+    assert len(p.pool) == 0
+    # By default, the OTs of the input bits of the receiver only.
+    assert len(p.ot.pads) == 0
+    assert p.precompute(2) == 2
+    assert len(p.ot.pads) == 2 * 64
+    return outputs
+
+
+filename = "circuit/basic/adder64.txt"
+circuit = read_circuit_from_file(filename)
+
+values = [(1, 2), (30, 40), (500, 600)]
+
+options = {"scheme": GarblingScheme.HALF_GATES, "pool_size": 2}
+sender_outputs, outputs = run_players(
+    player(
+        circuit,
+        Role.SENDER,
+        [[Int(a), PlaceHolder()] for a, _ in values],
+        evaluate,
+        **options,
+    ),
+    player(
+        circuit,
+        Role.RECEIVER,
+        [[PlaceHolder(), Int(b)] for _, b in values],
+        evaluate,
+        **options,
+    ),
+)
+
+for (a, b), output, sender_output in zip(values, outputs, sender_outputs):
+    assert output[0].val == a + b
+    assert sender_output[0].val == a + b
+    print(output[0])
@@ -0,0 +1,91 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+
+import numpy as np
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role, Session
+
+from helpers import player, read_circuit_from_file, run_players
+
+filename = "circuit/basic/mult64.txt"
+circuit = read_circuit_from_file(filename)
+
+a = 301
+b = 26
+
+for scheme in GarblingScheme:
+    options = {"scheme": scheme, "chunk_size": 1000}
+    sender_outputs, outputs = run_players(
+        player(circuit, Role.SENDER, [Int(a), PlaceHolder()], **options),
+        player(circuit, Role.RECEIVER, [PlaceHolder(), Int(b)], **options),
+    )
+    assert outputs[0].val == a * b
+    assert sender_outputs[0].val == a * b
+    print(scheme, outputs[0])
+
+    # The sender only keeps the keys of the slots, and garbles the same
+    # tables as with the keys of all the wires.
+    p = GarbledCircuit(
+        circuit, session=Session(Role.SENDER, scheme=scheme), chunk_size=1000
+    )
+    nonce = p.session.prg.new_nonce()
+    k = p.generate_slot_keys(nonce)
+    assert len(k) == p.slots[1] < p.num_wire
+    garbled_table = np.concatenate(
+        [
+            p.garble(k, start, min(start + 1000, p.num_gate), nonce)
+            for start in range(0, p.num_gate, 1000)
+        ]
+    )
+    full_k = p.generate_keys(nonce)
+    assert (garbled_table == p.create_garbled_table(full_k)).all()
+    assert (p.create_decoding_table(k) == p.create_decoding_table(full_k)).all()
+
+# On a REQ/REP socket pair, every chunk waits for its ack.
+results = {}
+
+
+def run_sender():
+    p = GarbledCircuit(
+        circuit,
+        role=Role.SENDER,
+        addr="inproc://streaming",
+        ot_addr="inproc://streaming-ot",
+        chunk_size=1000,
+    )
+    results["sender"] = p([Int(a), PlaceHolder()])
+
+
+p = GarbledCircuit(
+    circuit,
+    role=Role.RECEIVER,
+    addr="inproc://streaming",
+    ot_addr="inproc://streaming-ot",
+    chunk_size=1000,
+)
+sender = threading.Thread(target=run_sender)
+sender.start()
+outputs = p([PlaceHolder(), Int(b)])
+sender.join()
+assert outputs[0].val == results["sender"][0].val == a * b
@@ -0,0 +1,44 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+
+import numpy as np
+
+from garbled_circuit.hashing import GATE_HASHES, LABEL_SIZE, LabelPRG, get_gate_hash
+
+label = os.urandom(LABEL_SIZE)
+for name in GATE_HASHES:
+    H = get_gate_hash(name)
+    h = H(label, 1)
+    assert len(h) == LABEL_SIZE
+    assert h == get_gate_hash(name)(label, 1)
+    assert h != H(label, 2)
+    print(f"{name}: {h.hex()}")
+
+# The labels of the PRG are derived again from the seed and their index.
+seed = os.urandom(LABEL_SIZE)
+prg = LabelPRG(seed)
+labels = prg.labels(1000)
+assert labels.shape == (1000, LABEL_SIZE)
+assert len({label.tobytes() for label in labels}) == 1000
+assert np.array_equal(LabelPRG(seed).derive(0, [3, 999]), labels[[3, 999]])
+assert not np.array_equal(prg.labels(1000), labels)
@@ -0,0 +1,130 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role
+from garbled_circuit.metrics import NULL_METRICS, Metrics
+from garbled_circuit.transport import InprocTransport
+from helpers import read_circuit_from_file
+
+
+def run_sender(circuit, transport, inputs, results, metrics):
+    p1 = GarbledCircuit(
+        circuit,
+        role=Role.SENDER,
+        scheme=GarblingScheme.HALF_GATES,
+        transport=transport,
+        metrics=metrics,
+    )
+    results["sender"] = p1(inputs)
+
+
+filename = "circuit/basic/adder64.txt"
+circuit = read_circuit_from_file(filename)
+
+a = 301
+b = -26
+
+sender_metrics = Metrics()
+records = []
+receiver_metrics = Metrics(
+    callback=lambda kind, name, value: records.append((kind, name, value))
+)
+
+transports = InprocTransport.pair()
+results = {}
+sender = threading.Thread(
+    target=run_sender,
+    args=(circuit, transports[0], [Int(a), PlaceHolder()], results, sender_metrics),
+)
+sender.start()
+
+p2 = GarbledCircuit(
+    circuit,
+    role=Role.RECEIVER,
+    scheme=GarblingScheme.HALF_GATES,
+    transport=transports[1],
+    metrics=receiver_metrics,
+)
+outputs = p2([PlaceHolder(), Int(b)])
+sender.join()
+
+assert outputs[0].val == a + b
+assert results["sender"][0].val == a + b
+
+sender_snapshot = sender_metrics.snapshot()
+receiver_snapshot = receiver_metrics.snapshot()
+print(sender_snapshot)
+print(receiver_snapshot)
+
+sender_phases = sender_snapshot["phases"]
+receiver_phases = receiver_snapshot["phases"]
+for name in [
+    "label_generation",
+    "garble",
+    "table_transfer",
+    "input_transfer",
+    "ot",
+    "ot_setup",
+]:
+    assert sender_phases[name]["count"] >= 1
+    assert sender_phases[name]["seconds"] > 0
+for name in [
+    "table_transfer",
+    "input_transfer",
+    "ot",
+    "ot_setup",
+    "evaluate",
+    "decode",
+]:
+    assert receiver_phases[name]["count"] >= 1
+assert "evaluate" not in sender_phases and "garble" not in receiver_phases
+
+# Both directions are counted, including the messages of the OT.
+sender_counters = sender_snapshot["counters"]
+receiver_counters = receiver_snapshot["counters"]
+assert sender_counters["bytes_sent"] == transports[0].num_byte_sent
+assert receiver_counters["bytes_sent"] == transports[1].num_byte_sent
+assert sender_counters["bytes_sent"] == receiver_counters["bytes_received"]
+assert receiver_counters["bytes_sent"] == sender_counters["bytes_received"]
+assert sender_counters["messages_sent"] == receiver_counters["messages_received"]
+assert sender_counters["hash_calls"] > 0 and receiver_counters["hash_calls"] > 0
+# The receiver hashes the 64 output labels once to decode.
+assert receiver_counters["hash_labels"] >= 64
+
+# The callback sees every record.
+assert (
+    sum(value for kind, name, value in records if name == "bytes_sent")
+    == receiver_counters["bytes_sent"]
+)
+assert (
+    len([name for kind, name, _ in records if kind == "phase" and name == "evaluate"])
+    == 1
+)
+
+receiver_metrics.reset()
+assert receiver_metrics.snapshot() == {"phases": {}, "counters": {}}
+
+# Without metrics, nothing is recorded.
+p = GarbledCircuit(circuit, role=Role.SENDER, transport=InprocTransport.pair()[0])
+assert p.metrics is NULL_METRICS and p.gate_hash is p.ot.gate_hash
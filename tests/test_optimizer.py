@@ -0,0 +1,72 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+from garbled_circuit.optimizer import optimize
+from garbled_circuit.parser import parse, parse_file
+
+s = """12 14
+2 1 1
+1 1
+
+1 1 0 2 INV
+1 1 2 3 INV
+2 1 3 1 4 XOR
+2 1 0 1 5 XOR
+2 1 4 5 6 AND
+2 1 0 1 7 AND
+1 1 1 8 INV
+2 1 8 0 9 XOR
+2 1 6 9 10 AND
+2 1 10 6 11 XOR
+1 1 11 12 INV
+1 1 12 13 INV
+"""
+# Wire 3 and 13 are double inversions, wire 4 and 5 are the same XOR,
+# wire 6 is the AND of a wire with itself and wire 7 is dead.
+circuit = parse(s)
+optimized, report = optimize(circuit)
+print(report)
+assert report["num_and"] == (3, 1)
+assert report["num_gate"][1] < report["num_gate"][0]
+assert sum(report[name] for name in ["fold", "duplicate", "dead"]) == (
+    report["num_gate"][0] - report["num_gate"][1]
+)
+a = [0, 0, 1, 1]
+b = [0, 1, 0, 1]
+assert list(optimized.evaluate_batch([a, b])[0]) == list(
+    circuit.evaluate_batch([a, b])[0]
+)
+
+# The optimized circuits compute the same outputs.
+rng = np.random.default_rng(0)
+for name in ["adder64", "sub64", "mult64", "zero_equal"]:
+    circuit = parse_file(f"circuit/basic/{name}.txt")
+    optimized, report = optimize(circuit)
+    assert optimized.num_gate <= circuit.num_gate
+    inputs = [
+        rng.integers(-(1 << 63), 1 << 63, size=100, dtype=np.int64)
+        for _ in circuit.input_sizes
+    ]
+    for x, y in zip(circuit.evaluate_batch(inputs), optimized.evaluate_batch(inputs)):
+        assert np.array_equal(x, y)
+    print(name, report)
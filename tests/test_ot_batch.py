@@ -0,0 +1,43 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import random
+import threading
+
+from garbled_circuit.ot import OTReceiver, OTSender
+
+
+def run_sender(pairs):
+    sender = OTSender(addr="tcp://*:5557")
+    sender.transfer_many(pairs)
+
+
+pairs = [(random.randint(0, 100), random.randint(0, 100)) for _ in range(8)]
+sender = threading.Thread(target=run_sender, args=(pairs,))
+sender.start()
+
+receiver = OTReceiver(addr="tcp://127.0.0.1:5557")
+bits = [random.choice([True, False]) for _ in range(len(pairs))]
+vals = receiver.choose_many(bits)
+sender.join()
+
+assert vals == [pair[b] for pair, b in zip(pairs, bits)]
+print(f"Receiver ask for b = {[int(b) for b in bits]}, got x = {vals}.")
@@ -0,0 +1,52 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import random
+import threading
+
+import numpy as np
+
+from garbled_circuit.hashing import LABEL_SIZE
+from garbled_circuit.ot_extension import OTExtensionReceiver, OTExtensionSender
+
+
+def run_sender(batches):
+    sender = OTExtensionSender(addr="tcp://*:5556")
+    for pairs in batches:
+        sender.transfer_many(pairs)
+
+
+batches = []
+for m in [100, 13]:
+    pairs = np.frombuffer(os.urandom(m * 2 * LABEL_SIZE), np.uint8)
+    batches.append(pairs.reshape(m, 2, LABEL_SIZE))
+
+sender = threading.Thread(target=run_sender, args=(batches,))
+sender.start()
+
+receiver = OTExtensionReceiver(addr="tcp://127.0.0.1:5556")
+for pairs in batches:
+    bits = [random.randint(0, 1) for _ in range(len(pairs))]
+    vals = receiver.choose_many(bits)
+    assert (vals == pairs[np.arange(len(pairs)), bits]).all()
+    print(f"Receiver got {len(vals)} labels.")
+sender.join()
@@ -0,0 +1,68 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import os
+import tempfile
+
+import numpy as np
+
+from garbled_circuit.basic_types import Int
+from garbled_circuit.parser import load, parse, parse_file
+
+filename = "circuit/basic/mult64.txt"
+with open(filename) as f:
+    expected = parse(f.read()).program
+
+# Parse from a filename and from a file object.
+with open(filename) as f:
+    circuits = [parse_file(filename), parse_file(f)]
+with open(filename, "rb") as f:
+    circuits.append(parse_file(io.BytesIO(f.read())))
+
+with tempfile.TemporaryDirectory() as cache_dir:
+    circuits.append(load(filename, cache_dir))
+    assert len(os.listdir(cache_dir)) == 1
+    # The second load maps the compiled file.
+    cached = load(filename, cache_dir)
+    assert isinstance(cached.program.op, np.memmap)
+    # The schedule and the slots are mapped too, not computed again.
+    assert isinstance(cached.schedule.level, np.memmap)
+    assert isinstance(cached.slots[0].c, np.memmap)
+    assert cached.slots[1] == circuits[0].slots[1]
+    for name in ["op", "a", "b", "c", "level"]:
+        for mapped, computed in [
+            (cached.schedule, circuits[0].schedule),
+            (cached.slots[0], circuits[0].slots[0]),
+        ]:
+            assert np.array_equal(getattr(mapped, name), getattr(computed, name))
+    circuits.append(cached)
+
+    a = 15
+    b = -26
+    for circuit in circuits:
+        program = circuit.program
+        for name in ["op", "a", "b", "c"]:
+            assert np.array_equal(getattr(program, name), getattr(expected, name))
+        outputs = circuit([Int(a), Int(b)])
+        assert outputs[0].val == a * b
+    del cached, circuits, circuit, program, mapped, computed
+print(outputs[0])
@@ -0,0 +1,44 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+import zmq
+
+from garbled_circuit import protocol
+
+context = zmq.Context()
+a = context.socket(zmq.PAIR)
+a.bind("inproc://test_protocol")
+b = context.socket(zmq.PAIR)
+b.connect("inproc://test_protocol")
+
+table = np.arange(4 * 2 * 16, dtype=np.uint8).reshape(4, 2, 16)
+values = [None, 0, -5, 1 << 2000, "", "adder64", b"\x00\x01", table, [1, ("x", b"y")]]
+for value in values[:-1]:
+    protocol.send(a, value, zmq.SNDMORE)
+protocol.send(a, values[-1])
+
+received = [protocol.recv(b) for _ in values]
+assert received[:7] == values[:7]
+assert (received[7] == table).all() and received[7].shape == table.shape
+assert received[8] == [1, ["x", b"y"]]
+assert not b.getsockopt(zmq.RCVMORE)
+print(received[4:7])
@@ -0,0 +1,71 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role, Session
+from helpers import read_circuit_from_file, run_players
+
+circuits = {
+    "adder64": read_circuit_from_file("circuit/basic/adder64.txt"),
+    "sub64": read_circuit_from_file("circuit/basic/sub64.txt"),
+}
+requests = [("adder64", 10, 20), ("sub64", 500, 7), ("adder64", 1, 1)]
+
+
+def run_sender(transport):
+    session = Session(
+        Role.SENDER, scheme=GarblingScheme.HALF_GATES, transport=transport
+    )
+    for name, circuit in circuits.items():
+        session.register(name, circuit)
+    results = []
+    for name, a, _ in requests:
+        results.append(session.evaluate(name, [Int(a), PlaceHolder()])[0].val)
+    session.close()
+    return results
+
+
+def run_receiver(transport):
+    session = Session(
+        Role.RECEIVER, scheme=GarblingScheme.HALF_GATES, transport=transport
+    )
+    for name, circuit in circuits.items():
+        session.register(name, circuit)
+    receiver_inputs = iter([b for _, _, b in requests])
+    return list(session.serve(lambda name: [PlaceHolder(), Int(next(receiver_inputs))]))
+
+
+results, outputs = run_players(run_sender, run_receiver)
+
+expected = [30, 493, 2]
+assert [name for name, _ in outputs] == [name for name, _, _ in requests]
+assert [output[0].val for _, output in outputs] == expected
+assert results == expected
+print(expected)
+
+# A circuit of a session is garbled with the scheme of the session by default.
+offline = Session(Role.SENDER, scheme=GarblingScheme.FREE_XOR)
+p = GarbledCircuit(circuits["adder64"], session=offline)
+assert p.scheme == GarblingScheme.FREE_XOR
+p = GarbledCircuit(circuits["adder64"], session=offline, scheme=GarblingScheme.YAO)
+assert p.scheme == GarblingScheme.YAO
+# Closing an offline session sends nothing.
+offline.close()
@@ -0,0 +1,101 @@
+# Copyright 2021 zhuzilin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import queue
+import threading
+
+from garbled_circuit.basic_types import Int, PlaceHolder
+from garbled_circuit.gc import GarbledCircuit, GarblingScheme, Role
+from garbled_circuit.transport import InprocTransport, TCPTransport, ZMQTransport
+from helpers import read_circuit_from_file
+
+
+def run_sender(circuit, connect, inputs, results, ot_extension):
+    transport = connect()
+    p1 = GarbledCircuit(
+        circuit,
+        role=Role.SENDER,
+        scheme=GarblingScheme.HALF_GATES,
+        ot_extension=ot_extension,
+        transport=transport,
+    )
+    results["sender"] = p1(inputs)
+    transport.close()
+
+
+# The functions to connect the 2 players of every transport. The
+# receiver listens on a free port, and the sender waits for it.
+def inproc():
+    pair = InprocTransport.pair()
+    return lambda: pair[0], lambda: pair[1]
+
+
+def tcp():
+    port = queue.SimpleQueue()
+    return (
+        lambda: TCPTransport.connect("127.0.0.1", port.get()),
+        lambda: TCPTransport.listen("127.0.0.1", 0, bound=port.put),
+    )
+
+
+def zmq_pair():
+    endpoint = queue.SimpleQueue()
+
+    def bind():
+        transport = ZMQTransport.bind("tcp://127.0.0.1:*")
+        endpoint.put(transport.endpoint)
+        return transport
+
+    return lambda: ZMQTransport.connect(endpoint.get()), bind
+
+
+filename = "circuit/basic/adder64.txt"
+circuit = read_circuit_from_file(filename)
+
+a = 301
+b = -26
+
+# The circuit and the OT share the connection of the transport.
+for make in [inproc, tcp, zmq_pair]:
+    for ot_extension in [True, False]:
+        connect, listen = make()
+        results = {}
+        sender = threading.Thread(
+            target=run_sender,
+            args=(circuit, connect, [Int(a), PlaceHolder()], results, ot_extension),
+        )
+        sender.start()
+
+        transport = listen()
+        p2 = GarbledCircuit(
+            circuit,
+            role=Role.RECEIVER,
+            scheme=GarblingScheme.HALF_GATES,
+            ot_extension=ot_extension,
+            transport=transport,
+        )
+        outputs = p2([PlaceHolder(), Int(b)])
+        sender.join()
+        transport.close()
+
+        assert outputs[0].val == a + b
+        assert results["sender"][0].val == a + b
+        print(make.__name__, ot_extension, outputs[0])